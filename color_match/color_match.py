@@ -17,7 +17,9 @@ import _rpi_ws281x as ws
 import argparse
 import gpiozero
 import random
-from utils import comms
+import threading
+from utils import comms, hardware
+from utils.leds import FrameBuffer
 
 
 # game configuration:
@@ -33,17 +35,25 @@ MOT_SPEED               = 400 # in steps per second
 
 
 # button mapping configuration:
+#   bit is the bit each switch sets in the 24-bit switch color
 BUTTONS = {
-    'r1': {'btn': gpiozero.Button(4, pull_up=True, bounce_time=0.01), 'latched': True, 'pressed': False },
-    'r2': {'btn': gpiozero.Button(17, pull_up=True, bounce_time=0.01), 'latched': True, 'pressed': False },
-    'r3': {'btn': gpiozero.Button(27, pull_up=True, bounce_time=0.01), 'latched': True, 'pressed': False },
-    'g1': {'btn': gpiozero.Button(22, pull_up=True, bounce_time=0.01), 'latched': False, 'pressed': False },
-    'g2': {'btn': gpiozero.Button(5, pull_up=True, bounce_time=0.01), 'latched': False, 'pressed': False },
-    'g3': {'btn': gpiozero.Button(6, pull_up=True, bounce_time=0.01), 'latched': False, 'pressed': False },
-    'b1': {'btn': gpiozero.Button(20, pull_up=True, bounce_time=0.01), 'latched': False, 'pressed': False },
-    'b2': {'btn': gpiozero.Button(21, pull_up=True, bounce_time=0.01), 'latched': True, 'pressed': False }
+    'r1': {'btn': hardware.button(4, pull_up=True, bounce_time=0.01), 'latched': True, 'bit': 16 + COLOR_HIGHEST_BIT },
+    'r2': {'btn': hardware.button(17, pull_up=True, bounce_time=0.01), 'latched': True, 'bit': 16 + COLOR_HIGHEST_BIT - 1 },
+    'r3': {'btn': hardware.button(27, pull_up=True, bounce_time=0.01), 'latched': True, 'bit': 16 + COLOR_HIGHEST_BIT - 2 },
+    'g1': {'btn': hardware.button(22, pull_up=True, bounce_time=0.01), 'latched': False, 'bit': 8 + COLOR_HIGHEST_BIT },
+    'g2': {'btn': hardware.button(5, pull_up=True, bounce_time=0.01), 'latched': False, 'bit': 8 + COLOR_HIGHEST_BIT - 1 },
+    'g3': {'btn': hardware.button(6, pull_up=True, bounce_time=0.01), 'latched': False, 'bit': 8 + COLOR_HIGHEST_BIT - 2 },
+    'b1': {'btn': hardware.button(20, pull_up=True, bounce_time=0.01), 'latched': False, 'bit': COLOR_HIGHEST_BIT },
+    'b2': {'btn': hardware.button(21, pull_up=True, bounce_time=0.01), 'latched': True, 'bit': COLOR_HIGHEST_BIT - 1 }
 }
 
+# device -> its bit in the switch color, built by setup_buttons()
+SWITCH_MASKS = {}
+
+# the switch color, only ever changed from the edge callbacks below
+switch_state = 0
+switch_changed = threading.Condition()
+
 # dispensing configuration:
 SECS_PER_REV            = 1.06
 REVS_PER_DISPENSE       = 1
@@ -65,7 +75,7 @@ PIXEL_TARGET            = 1      # LED number of target color
 
 motor = gpiozero.PhaseEnableMotor(MOT_DIR_PIN, MOT_STEP_PIN)
 
-strip = Adafruit_NeoPixel(LED_COUNT, LED_PIN, LED_FREQ_HZ, LED_DMA, LED_INVERT, LED_BRIGHTNESS, LED_CHANNEL, ws.WS2812_STRIP)
+strip = FrameBuffer(Adafruit_NeoPixel(LED_COUNT, LED_PIN, LED_FREQ_HZ, LED_DMA, LED_INVERT, LED_BRIGHTNESS, LED_CHANNEL, ws.WS2812_STRIP))
 strip.begin()
 
 wof = comms.Comms()
@@ -73,48 +83,74 @@ wof = comms.Comms()
 
 def setup_buttons(args):
     for btn in BUTTONS:
-        if not BUTTONS[btn]['latched']:
+        SWITCH_MASKS[BUTTONS[btn]['btn']] = 1 << BUTTONS[btn]['bit']
+        if BUTTONS[btn]['latched']:
+            BUTTONS[btn]['btn'].when_pressed = handle_on
+            BUTTONS[btn]['btn'].when_released = handle_off
+        else:
             BUTTONS[btn]['btn'].when_pressed = handle_toggle
+    sync_switches()
+
+
+def update_switches(clear, flip):
+    global switch_state
+    with switch_changed:
+        switch_state = (switch_state & ~clear) ^ flip
+        switch_changed.notify_all()
 
 
 def handle_toggle(pressedBtn):
+    update_switches(0, SWITCH_MASKS[pressedBtn])
+
+
+def handle_on(pressedBtn):
+    mask = SWITCH_MASKS[pressedBtn]
+    update_switches(mask, mask)
+
+
+def handle_off(releasedBtn):
+    update_switches(SWITCH_MASKS[releasedBtn], 0)
+
+
+def sync_switches():
+    '''Re-read the latched switches, in case debouncing swallowed an edge'''
+    latched = 0
+    value = 0
     for btn in BUTTONS:
-        if BUTTONS[btn]['btn'] == pressedBtn:
-            BUTTONS[btn]['pressed'] = not BUTTONS[btn]['pressed']
+        if BUTTONS[btn]['latched']:
+            mask = SWITCH_MASKS[BUTTONS[btn]['btn']]
+            latched |= mask
+            if BUTTONS[btn]['btn'].value:
+                value |= mask
+    update_switches(latched, value)
 
 
 def color_wipe(color, wait=0.05):
+    if not wait:
+        # nothing to animate, so set them all and show once
+        strip.fill(color)
+        strip.show()
+        return
     for i in range(strip.numPixels()):
         strip.setPixelColor(i, color)
         strip.show()
         time.sleep(wait)
 
 
-def read_switch(btn):
-    if BUTTONS[btn]['latched']:
-        return BUTTONS[btn]['btn'].value
-    else:
-        return BUTTONS[btn]['pressed']
-
-
 def read_switches():
-    rbyte = 0
-    gbyte = 0
-    bbyte = 0
-
     # FIXME: use LS bits or MS bits of each color byte for best color?
-    rbyte |= read_switch('r1') << COLOR_HIGHEST_BIT
-    rbyte |= read_switch('r2') << COLOR_HIGHEST_BIT - 1
-    rbyte |= read_switch('r3') << COLOR_HIGHEST_BIT - 2
+    return switch_state
 
-    gbyte |= read_switch('g1') << COLOR_HIGHEST_BIT
-    gbyte |= read_switch('g2') << COLOR_HIGHEST_BIT - 1
-    gbyte |= read_switch('g3') << COLOR_HIGHEST_BIT - 2
 
-    bbyte |= read_switch('b1') << COLOR_HIGHEST_BIT
-    bbyte |= read_switch('b2') << COLOR_HIGHEST_BIT - 1
-
-    return (rbyte << 16) | (gbyte << 8) | bbyte
+def wait_switches(last, deadline):
+    '''Block until the switch color differs from last or deadline passes'''
+    with switch_changed:
+        while switch_state == last:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            switch_changed.wait(remaining)
+        return switch_state
 
 
 def dispense(items=1):
@@ -189,11 +225,12 @@ def run_game(args):
     strip.setPixelColor(PIXEL_TARGET, target_color)
 
     start_time = time.time()
+    end_time = start_time + GAME_TIMEOUT_SECS
     debug_time = start_time
+    sync_switches()
+    switch_color = read_switches()
 
     while True:
-        switch_color = read_switches()
-
         if args.debug:
             if time.time() >= debug_time:
                 debug_time = time.time() + DEBUG_STATUS_SECS
@@ -207,19 +244,28 @@ def run_game(args):
 
         strip.setPixelColor(PIXEL_CURRENT, switch_color)
         strip.show()
-        time.sleep(0.1)
 
         if switch_color == target_color:
             if args.debug:
                 print("WINNER WINNER!")
             blink_panels(Color(0, 255, 0), 6, 0.2)
             dispense(1)
-            return
-        elif start_time + GAME_TIMEOUT_SECS < time.time():
+            break
+        elif end_time <= time.time():
             if args.debug:
                 print("TIMEOUT - YOU LOOSE")
             blink_panels(Color(255, 0, 0), 6, 0.3)
-            return
+            break
+
+        # sleep until a switch flips, the game times out or the next
+        # debug status is due
+        deadline = end_time
+        if args.debug:
+            deadline = min(deadline, debug_time)
+        switch_color = wait_switches(switch_color, deadline)
+
+    if args.debug:
+        print(strip.stats())
 
 
 def run_main():
@@ -234,29 +280,28 @@ def run_main():
         if args.debug:
             print("Target set to {0}.".format(args.target))
 
-    wof.begin("colormatch")
+    wof.begin("colormatch", reliable=True)
 
     try:
         setup_buttons(args)
+        cartdone = wof.subscribe('CARTDONE')
 
         while True:
             if args.local:
                 run_game(args)
                 color_wipe(Color(0, 0, 0), 0)
                 time.sleep(3)
-            elif wof.available():
-                (origin, message) = wof.recv()
+            else:
+                (origin, message) = cartdone.recv(timeout=None)
                 if args.debug:
                     print("Received network message from {0}: {1}".format(origin, message))
-                if message == 'CARTDONE':
-                    run_game(args)
-                    color_wipe(Color(0, 0, 0), 0)
-                    wof.send('RESET')
-                else:
+                run_game(args)
+                color_wipe(Color(0, 0, 0), 0)
+                wof.send('RESET')
+                while wof.available():
+                    (origin, message) = wof.recv()
                     if args.debug:
                         print("Unknown message: {0}".format(message))
-            else:
-                time.sleep(1)
 
     except KeyboardInterrupt:
         color_wipe(Color(0, 0, 0), 0.1)
@@ -4,6 +4,7 @@ import time
 import datetime
 from neopixel import *
 from gpiozero import Button
+from utils.leds import FrameBuffer
 import argparse
 
 # LED strip configuration:
@@ -14,6 +15,7 @@ LED_DMA        = 10      # DMA channel to use for generating signal (try 10)
 LED_BRIGHTNESS = 150
 LED_INVERT     = False   # True to invert the signal (when using NPN transistor level shift)
 LED_CHANNEL    = 0       # set to '1' for GPIOs 13, 19, 41, 45 or 53
+LOOP_FPS       = 30      # button checks (and at most LED updates) per second
 
 button1 = Button(14)
 button2 = Button(15)
@@ -26,9 +28,7 @@ SPEECH_DELAY = 60
 
 def set_red(strip, value=200):
     """Set HAL to the correct brightness of red based on how many buttons are pressed"""
-    for i in range(strip.numPixels()):
-            strip.setPixelColor(i, Color(0,value,0))
-    strip.show()
+    strip.fill(Color(0,value,0))
 
 def number_of_buttons_pressed():
     """Count of buttons pressed at one time """
@@ -40,6 +40,7 @@ def number_of_buttons_pressed():
 
 def too_soon_to_speak():
     """ Check if enough time has elapsed since last spoken """
+    global speech_timer
     now_time = datetime.datetime.now()
     if int((speech_timer - now_time).total_seconds()) > SPEECH_DELAY:
         speech_timer = now_time
@@ -47,7 +48,7 @@ def too_soon_to_speak():
     else:
         return True
 
-def speak_audio(current_buttons)
+def speak_audio(current_buttons):
     """ Checks if hal can speak, if it can play wave file based on number of buttons pressed """
     if not too_soon_to_speak():
         if current_buttons > 1:
@@ -57,7 +58,7 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('-c', '--clear', action='store_true', help='clear the display on exit')
     args = parser.parse_args()
-    strip = Adafruit_NeoPixel(LED_COUNT, LED_PIN, LED_FREQ_HZ, LED_DMA, LED_INVERT, LED_BRIGHTNESS, LED_CHANNEL)
+    strip = FrameBuffer(Adafruit_NeoPixel(LED_COUNT, LED_PIN, LED_FREQ_HZ, LED_DMA, LED_INVERT, LED_BRIGHTNESS, LED_CHANNEL))
     strip.begin()
     print ('Press Ctrl-C to quit.')
     if not args.clear:
@@ -73,7 +74,12 @@ if __name__ == '__main__':
                 set_red(strip, 180)
             else:
                 set_red(strip, 250)
+            # one show per pass, and only when the red actually changed
+            strip.show()
+            time.sleep(1.0 / LOOP_FPS)
     except KeyboardInterrupt:
+        print(strip.stats())
         if args.clear:
-            colorWipe(strip, Color(0,0,0), 10)
+            strip.fill(Color(0,0,0))
+            strip.show()
 
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+###############################################################################
+# orchestrator.py                                                             #
+#                                                                             #
+#    Watch the Wall of Fortune game flow, restart stalled stages and keep     #
+#    per-stage timing statistics                                              #
+#                                                                             #
+#    For more information, see https://github.com/makerhqsac/wall_of_fortune  #
+#                                                                             #
+#    Sponsored by MakerHQ - http://www.makerhq.org                            #
+#                                                                             #
+#    Licensed under the GPLv3 - https://www.gnu.org/licenses/gpl-3.0.txt      #
+###############################################################################
+#
+# The wall runs as a loop of three panels, each started by the
+# previous one's broadcast:
+#
+#   RESET -> zoltar -> COMPLETE -> cartography -> CARTDONE -> colormatch -> RESET
+#
+# (cartography also sends RESET when the player loses.)  This listens on
+# the bus, tracks which stage is running, re-sends a stage's trigger if
+# it runs past its timeout, and reports stage durations and games/hour.
+#
+# A trigger is only re-sent if the stage's panel has not been heard
+# from (not even an ack of its trigger) since the trigger went out.  A
+# panel that acked it is just slow, and a second trigger would only
+# queue up a phantom game behind the one it is playing.
+
+import argparse
+import bisect
+import collections
+import json
+import time
+from utils import comms
+
+
+# stage configuration:
+#   trigger  - message that starts the stage
+#   sender   - panel the trigger comes from (panels filter on it)
+#   done     - message that ends the stage and starts the next one
+#   timeout  - seconds before the stage counts as stalled, None to never
+STAGES = collections.OrderedDict([
+    ('zoltar',      {'trigger': 'RESET',    'sender': 'orchestrator', 'done': 'COMPLETE', 'timeout': None}),
+    ('cartography', {'trigger': 'COMPLETE', 'sender': 'zoltar',       'done': 'CARTDONE', 'timeout': 120}),
+    ('colormatch',  {'trigger': 'CARTDONE', 'sender': 'cartography',  'done': 'RESET',    'timeout': 150}),
+])
+
+STALL_RETRIES       = 2       # re-sends of a stage trigger before restarting the wall
+HISTORY_SECS        = 3600    # rolling window for histograms and throughput
+REPORT_SECS         = 60      # how often to print and export statistics
+HISTOGRAM_BUCKETS   = (5, 10, 20, 30, 45, 60, 90, 120, 180, 300)
+
+
+class Orchestrator(object):
+    def __init__(self, comm_client, timeouts=None, history=HISTORY_SECS):
+        self.communications = comm_client
+        self.timeouts = dict((stage, STAGES[stage]['timeout']) for stage in STAGES)
+        if timeouts:
+            self.timeouts.update(timeouts)
+        self.history = history
+
+        self.senders = {}
+        self.stage = None
+        self.stage_start = None
+        self.watch_start = None     # the stall timeout runs from here
+        self.triggered = None       # when the stage's trigger was read or sent
+        self.game_start = None
+        self.retries = 0
+
+        self.durations = collections.deque()
+        self.games = collections.deque()
+        self.stalls = collections.Counter()
+        self.started = None
+
+    def enter(self, stage, now, triggered=None):
+        self.stage = stage
+        self.stage_start = now
+        self.watch_start = now
+        self.triggered = now if triggered is None else triggered
+        self.retries = 0
+        if stage == 'zoltar':
+            self.game_start = now
+
+    def finish_stage(self, now):
+        if self.stage is not None:
+            self.durations.append((now, self.stage, now - self.stage_start))
+
+    def handle(self, origin, message, now):
+        # the panel's ack of this trigger may have been read in the same drain
+        triggered = self.communications.heard.get(origin, now)
+        if message == 'RESET':
+            if self.stage == 'zoltar':
+                # already waiting on zoltar, nothing new started
+                return
+            if self.stage is not None and origin != self.communications.name:
+                self.finish_stage(now)
+                self.games.append((now, now - self.game_start))
+            self.enter('zoltar', now, triggered)
+            return
+
+        if self.stage is None or message != STAGES[self.stage]['done']:
+            return
+
+        self.finish_stage(now)
+        stages = list(STAGES)
+        self.enter(stages[stages.index(self.stage) + 1], now, triggered)
+
+    def check_stall(self, now):
+        deadline = self.deadline()
+        if deadline is None or now < deadline:
+            return
+
+        self.stalls[self.stage] += 1
+        self.watch_start = now
+        if self.busy():
+            print('Stage {0} running long ({1:.0f}s) but its panel has the trigger, waiting'.format(
+                self.stage, now - self.stage_start))
+        elif self.retries < STALL_RETRIES:
+            print('Stage {0} stalled after {1:.0f}s, re-sending {2}'.format(
+                self.stage, now - self.stage_start, STAGES[self.stage]['trigger']))
+            self.retries += 1
+            self.triggered = now
+            self.trigger(self.stage)
+        else:
+            print('Stage {0} still stalled, restarting the wall'.format(self.stage))
+            self.enter('zoltar', now)
+            self.trigger('zoltar')
+
+    def deadline(self):
+        if self.stage is None or self.timeouts[self.stage] is None:
+            return None
+        return self.watch_start + self.timeouts[self.stage]
+
+    def busy(self):
+        '''True if the stage's panel has been heard from since its trigger'''
+        heard = self.communications.heard.get(self.stage)
+        return heard is not None and heard >= self.triggered
+
+    def trigger(self, stage):
+        sender = STAGES[stage]['sender']
+        if sender == self.communications.name:
+            self.communications.send(STAGES[stage]['trigger'])
+            return
+
+        if sender not in self.senders:
+            self.senders[sender] = comms.Comms()
+            self.senders[sender].begin(sender, self.communications.port, listen=False)
+        self.senders[sender].send(STAGES[stage]['trigger'])
+
+    def expire(self, now):
+        while self.durations and self.durations[0][0] < now - self.history:
+            self.durations.popleft()
+        while self.games and self.games[0][0] < now - self.history:
+            self.games.popleft()
+
+    def histogram(self, values):
+        counts = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        for value in values:
+            counts[bisect.bisect_left(HISTOGRAM_BUCKETS, value)] += 1
+        labels = ['<=%d' % b for b in HISTOGRAM_BUCKETS] + ['>%d' % HISTOGRAM_BUCKETS[-1]]
+        return collections.OrderedDict(zip(labels, counts))
+
+    def report(self, now):
+        self.expire(now)
+        window = self.history
+        if self.started is not None:
+            window = min(window, now - self.started)
+
+        stats = collections.OrderedDict()
+        stats['window_secs'] = round(window)
+        stats['games'] = len(self.games)
+        stats['games_per_hour'] = round(len(self.games) * 3600.0 / max(window, 1), 2)
+        stats['stage'] = self.stage
+        stats['stalls'] = dict(self.stalls)
+        stats['stages'] = collections.OrderedDict()
+        for stage in STAGES:
+            values = [d for (t, s, d) in self.durations if s == stage]
+            stats['stages'][stage] = collections.OrderedDict([
+                ('count', len(values)),
+                ('mean_secs', round(sum(values) / len(values), 2) if values else None),
+                ('histogram', self.histogram(values)),
+            ])
+        stats['game_histogram'] = self.histogram([d for (t, d) in self.games])
+        return stats
+
+    def run(self, stats_file=None, debug=False):
+        self.started = time.monotonic()
+        report_time = self.started + REPORT_SECS
+
+        while True:
+            now = time.monotonic()
+            wake = report_time
+            deadline = self.deadline()
+            if deadline is not None:
+                wake = min(wake, deadline)
+
+            (origin, message) = self.communications.recv(timeout=max(wake - now, 0))
+            now = time.monotonic()
+            if message:
+                if debug:
+                    print('Received network message from {0}: {1}'.format(origin, message))
+                self.handle(origin, message, now)
+
+            self.check_stall(now)
+
+            if now >= report_time:
+                report_time = now + REPORT_SECS
+                stats = self.report(now)
+                print('{0} games in the last {1}s ({2} games/hour), stage {3}'.format(
+                    stats['games'], stats['window_secs'], stats['games_per_hour'], stats['stage']))
+                if stats_file:
+                    with open(stats_file, 'w') as f:
+                        json.dump(stats, f, indent=2)
+
+
+def run_main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d', '--debug', action='store_true', help='print every message seen')
+    parser.add_argument('-p', '--port', action='store', help='network port to use, use default if not specified')
+    parser.add_argument('-s', '--stats', action='store', help='file to write JSON statistics to')
+    for stage in STAGES:
+        parser.add_argument('--%s-timeout' % stage, type=float, default=STAGES[stage]['timeout'],
+                            help='seconds before the %s stage counts as stalled' % stage)
+    args = parser.parse_args()
+
+    wof = comms.Comms()
+    if args.port:
+        wof.begin('orchestrator', int(args.port), reliable=True)
+    else:
+        wof.begin('orchestrator', reliable=True)
+
+    timeouts = dict((stage, getattr(args, '%s_timeout' % stage)) for stage in STAGES)
+    orchestrator = Orchestrator(wof, timeouts)
+    try:
+        orchestrator.run(args.stats, args.debug)
+    except KeyboardInterrupt:
+        wof.close()
+
+
+# Main program logic follows:
+if __name__ == '__main__':
+    run_main()
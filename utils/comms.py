@@ -12,69 +12,755 @@ if data is available.
 2. Begin the communications with the panel name
     c.begin("zoltar")
 
+   Each begin() opens a socket on the shared port, so make one
+   per process and pass it around.  A one-shot sender that never
+   reads (e.g. a CLI) can skip binding the port altogether, and
+   close() (or a with block) releases the socket.
+    with comms.Comms() as c:
+        c.begin("admin", listen=False)
+        c.send('RESET')
+
 3. Listen for any data and pull out the tuple
     if c.available():
        # origin = original panel (e.g. "xy_chase", "color_match")
        # data = data sent from panel
        (origin, data) = c.recv()
 
+   Or block (using no CPU) until something arrives.  A timeout
+   of None waits forever, ("", "") is returned on timeout.
+    (origin, data) = c.recv(timeout=None)
+
+   Or wait for one specific message, leaving any others queued.
+   Returns None on timeout.
+    c.wait_for('COMPLETE', origin='zoltar', timeout=30)
+
+   Each available() call drains everything queued on the socket
+   into a ring of RING_SLOTS reusable buffers; text payloads are
+   only decoded when recv() hands them out.  c.last_drain holds
+   the (packets, bytes, drops) of the latest non-empty drain and
+   c.packets_read, c.bytes_read, c.malformed the running totals.
+   drops counts malformed packets and messages pushed out of a full
+   queue (QUEUE_LIMIT); c.overflowed is the running total of the
+   latter.  c.heard maps each origin to the time.monotonic() of the
+   drain its latest packet (acks included) was read in.
+
+   Or claim a message so that nothing else can recv() it.  The
+   subscription has its own queue (or calls handler(origin, data)
+   from inside available()); unclaimed traffic stays on c.recv().
+    coin = c.subscribe('COIN')
+    c.subscribe('RESET', origin='colormatch', handler=on_reset)
+    if coin.available():
+       (origin, data) = coin.recv()
+    coin.cancel()
+
 4. Broadcast data to all panels
     c.send('RESET');
     c.send('COMPLETE');
+
+   Packets go out as compact binary frames (see FRAME_HEADER).
+   Old panels that only speak the 'name:data' text format are
+   still understood; begin with legacy=True to send text too.
+   Old panels match the origin exactly, so legacy text frames are
+   never sequenced and legacy=True cannot be combined with reliable.
+
+   By default packets are broadcast to the whole LAN.  To keep two
+   walls on one network apart, give each its own multicast group
+   and/or wall id (or set WOF_GROUP, WOF_INTERFACE and WOF_WALL):
+    c.begin("zoltar", group='239.77.79.70', interface='wlan0', wall=2)
+
+5. Optionally, begin in reliable mode.  Every send() then carries
+   a sequence number and is retransmitted with exponential backoff
+   until each known peer acks it (or RETRY_LIMIT is reached).
+   Peers are learned from the acks heard; a send made before any
+   are known keeps retrying for the whole RETRY_LIMIT, since there
+   is no telling who has not heard it yet, and a peer that misses
+   PEER_MISSES sends in a row is forgotten until it acks again.
+   Any Comms instance acks and de-duplicates these on receive.
+   Retransmits happen inside available()/recv()/wait(), so keep
+   calling one of them, or call flush() before exiting.
+    c.begin("zoltar", reliable=True)
+    c.send('COMPLETE')
+    c.flush(timeout=5)
+
+AsyncComms speaks the same wire format from inside an asyncio
+event loop, so a panel can run its game loop, hardware polling
+and network listener as cooperative tasks:
+
+    c = comms.AsyncComms()
+    await c.begin("zoltar")
+    await c.send('COMPLETE')
+    async for (origin, data) in c:
+        ...
 '''
 
+import os
 import socket
 import collections
+import selectors
+import time
+import random
+import struct
+import asyncio
 
 DEFAULT_PORT = 43822
+MAX_PACKET   = 65507
+RING_SLOTS   = 8        # receive buffers holding not-yet-decoded payloads
+QUEUE_LIMIT  = 1024     # oldest messages are dropped past this many
+
+# multicast configuration (used when a group is given to begin()):
+MULTICAST_TTL   = 1     # stay on the local network segment
+
+# binary frame header:
+#   magic, version, wall id, origin id, message type, sequence,
+#   monotonic ms, payload length
+# a named origin (ORIGIN_NAMED) is sent as a length byte and the name
+# at the start of the payload.  Version 1 frames (no wall id) and
+# legacy text frames are still accepted as wall 0.
+FRAME_MAGIC     = 0xFF  # never the first byte of a UTF-8 text frame
+FRAME_VERSION   = 2
+FRAME_HEADER    = struct.Struct('!BBBBBIIH')
+FRAME_HEADER_V1 = struct.Struct('!BBBBIIH')
+
+ORIGIN_NAMED    = 0
+ORIGIN_IDS = {
+    'admin': 1,
+    'zoltar': 2,
+    'cartography': 3,
+    'colormatch': 4
+}
+ORIGIN_NAMES = {v: k for (k, v) in ORIGIN_IDS.items()}
+
+TYPE_DATA       = 0     # free-form text payload
+TYPE_ACK        = 1     # payload is the acked sender, sequence is the acked one
+MESSAGE_TYPES = {
+    'RESET': 2,
+    'COMPLETE': 3,
+    'CARTDONE': 4,
+    'COIN': 5
+}
+MESSAGE_NAMES = {v: k for (k, v) in MESSAGE_TYPES.items()}
+
+# reliable mode configuration:
+ACK_PREFIX      = '@ack:'
+RETRY_INITIAL   = 0.05  # first retransmit after this many seconds
+RETRY_MAX       = 1.0   # backoff doubles up to this interval
+RETRY_LIMIT     = 8     # retransmits before giving up on a message
+DEDUP_WINDOW    = 64    # recent sequence numbers remembered per peer
+PEER_MISSES     = 2     # sends in a row a peer can miss before it is forgotten
+
+
+def open_socket(port, group = None, interface = None, ttl = MULTICAST_TTL, loopback = True, listen = True):
+    '''Open the panel socket, joining multicast group if one is given
+
+    interface is a network device name (e.g. "wlan0" or "lo") to
+    bind to and send multicast from, otherwise the OS picks.  With
+    listen False the socket is never bound to port, so it only sends.'''
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setblocking(0)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+    ifindex = 0
+    if interface:
+        ifindex = socket.if_nametoindex(interface)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, interface.encode())
+
+    if group and listen:
+        # struct ip_mreqn: group address, local address, interface index
+        mreqn = struct.pack('4s4si', socket.inet_aton(group), socket.inet_aton('0.0.0.0'), ifindex)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreqn)
+
+    if group:
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, int(loopback))
+        if ifindex:
+            mreqn = struct.pack('4s4si', socket.inet_aton(group), socket.inet_aton('0.0.0.0'), ifindex)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, mreqn)
+
+    if listen:
+        sock.bind(('' , port))
+    return sock
+
+
+def network_settings(group = None, interface = None, wall = None):
+    '''Fill in unset multicast group, interface and wall id from the environment
+
+    WOF_GROUP, WOF_INTERFACE and WOF_WALL let every panel of a wall
+    be pointed at its own group/namespace without code changes.'''
+    if group is None:
+        group = os.getenv('WOF_GROUP') or None
+    if interface is None:
+        interface = os.getenv('WOF_INTERFACE') or None
+    if wall is None:
+        wall = int(os.getenv('WOF_WALL', 0))
+    return (group, interface, wall)
+
+
+def encode(name, data, seq = 0, legacy = False, wall = 0):
+    if legacy:
+        # plain 'name:data', which is all an old panel understands
+        return (name + ':' + data).encode()
+
+    msg_type = MESSAGE_TYPES.get(data, TYPE_DATA)
+    if msg_type != TYPE_DATA:
+        data = ''
+    return pack_frame(name, msg_type, seq, data, wall)
+
+
+def encode_ack(name, target, seq, legacy = False, wall = 0):
+    if legacy:
+        return encode(name, '%s%s#%d' % (ACK_PREFIX, target, seq), legacy=True)
+    return pack_frame(name, TYPE_ACK, seq, target, wall)
+
+
+def check_name(name):
+    '''Raise ValueError if name cannot be sent as a frame's origin'''
+    if name not in ORIGIN_IDS and len(name.encode()) > 255:
+        raise ValueError('panel name {0!r}... is longer than 255 bytes'.format(name[:16]))
+
+
+def pack_frame(name, msg_type, seq, data, wall = 0):
+    payload = data.encode()
+    origin_id = ORIGIN_IDS.get(name, ORIGIN_NAMED)
+    if origin_id == ORIGIN_NAMED:
+        named = name.encode()
+        payload = bytes([len(named)]) + named + payload
+
+    stamp = int(time.monotonic() * 1000) & 0xFFFFFFFF
+    header = FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, wall, origin_id, msg_type,
+                               seq & 0xFFFFFFFF, stamp, len(payload))
+    return header + payload
+
+
+def unpack_header(data):
+    '''Return (origin, msg_type, seq, start, end, wall) for a binary frame
+
+    The payload is left undecoded as data[start:end].  Returns None
+    if the frame is malformed.'''
+    try:
+        if data[1] == FRAME_VERSION:
+            (magic, version, wall, origin_id, msg_type, seq, stamp, length) = FRAME_HEADER.unpack_from(data)
+            start = FRAME_HEADER.size
+        elif data[1] == 1:
+            (magic, version, origin_id, msg_type, seq, stamp, length) = FRAME_HEADER_V1.unpack_from(data)
+            wall = 0
+            start = FRAME_HEADER_V1.size
+        else:
+            return None
+
+        end = start + length
+        if len(data) < end:
+            return None
+
+        if origin_id == ORIGIN_NAMED:
+            named = data[start]
+            origin = str(data[start + 1:start + 1 + named], 'utf-8')
+            start += 1 + named
+        elif origin_id in ORIGIN_NAMES:
+            origin = ORIGIN_NAMES[origin_id]
+        else:
+            return None
+    except (ValueError, IndexError, struct.error):
+        return None
+
+    if msg_type not in MESSAGE_NAMES and msg_type != TYPE_DATA and msg_type != TYPE_ACK:
+        return None
+    return (origin, msg_type, seq or None, start, end, wall)
+
+
+def unpack_frame(data, wall = 0):
+    header = unpack_header(data)
+    if header is None or header[5] != wall:
+        return None
+
+    (origin, msg_type, seq, start, end, wall) = header
+    if msg_type == TYPE_DATA:
+        message = str(data[start:end], 'utf-8')
+    elif msg_type == TYPE_ACK:
+        message = ACK_PREFIX + str(data[start:end], 'utf-8')
+    else:
+        message = MESSAGE_NAMES[msg_type]
+
+    return (origin, message, seq)
+
+
+def decode(data, wall = 0):
+    '''Return (origin, message, seq) for a binary or legacy text packet
+
+    data may be a memoryview into a receive buffer.  seq is None for
+    unsequenced packets; for acks message is ACK_PREFIX + the acked
+    sender and seq is the acked sequence number.  Returns None if the
+    packet is malformed or belongs to another wall.'''
+    try:
+        if len(data) and data[0] == FRAME_MAGIC:
+            return unpack_frame(data, wall)
+        if wall != 0:
+            return None
+
+        ( origin, message ) = str(data, 'utf-8').split(':', 1)
+    except (ValueError, IndexError, struct.error):
+        return None
+
+    (origin, seq) = split_sequence(origin)
+    if message.startswith(ACK_PREFIX):
+        (target, seq) = split_sequence(message[len(ACK_PREFIX):])
+        if seq is None:
+            return None
+        message = ACK_PREFIX + target
+    return (origin, message, seq)
+
+
+def split_sequence(origin):
+    '''Split a reliable origin "name#seq" into (name, seq), seq is None if absent'''
+    (name, sep, seq) = origin.rpartition('#')
+    if not sep or not seq.isdigit():
+        return (origin, None)
+    return (name, int(seq))
+
+
+def is_duplicate(seen, name, seq):
+    recent = seen.setdefault(name, collections.deque([], DEDUP_WINDOW))
+    if seq in recent:
+        return True
+    recent.append(seq)
+    return False
+
+
+class _Pending:
+    def __init__(self, packet, port, peers):
+        self.packet = packet
+        self.port = port
+        self.waiting = peers
+        self.blind = not peers  # nobody known yet, so retry until RETRY_LIMIT
+        self.acked = False
+        self.sent = time.monotonic()
+        self.attempts = 0
+        self.interval = RETRY_INITIAL
+        self.next_time = self.sent + self.interval
+
+
+DrainStats = collections.namedtuple('DrainStats', 'packets bytes drops')
+
+
+class Subscription:
+    def __init__(self, comms, message, origin, handler):
+        self.comms = comms
+        self.message = message
+        self.origin = origin
+        self.handler = handler
+        self.messages = collections.deque([], QUEUE_LIMIT)
+
+    def deliver(self, origin, message):
+        if self.handler:
+            self.handler(origin, message)
+        else:
+            self.comms.enqueue(self.messages, (origin, message))
+
+    def available(self):
+        self.comms.available()
+        return len(self.messages)
+
+    def recv(self, timeout = 0):
+        if not self.messages and timeout != 0:
+            self.comms.poll(lambda: self.messages, timeout)
+
+        try:
+            return self.messages.popleft()
+        except IndexError:
+            return ("", "")
+
+    def cancel(self):
+        self.comms.unsubscribe(self)
+
 
 class Comms:
     def __init__(self):
         pass
 
-    def begin(self, name, port = DEFAULT_PORT):
+    def begin(self, name, port = DEFAULT_PORT, reliable = False, legacy = False,
+              group = None, interface = None, wall = None, ttl = MULTICAST_TTL, loopback = True,
+              listen = True):
+        if legacy and reliable:
+            raise ValueError('reliable mode needs binary frames, old panels would not '
+                             'recognise a sequenced legacy origin')
+        check_name(name)
         self.name = name
         self.port = port
-        self.messages = collections.deque([])
+        self.legacy = legacy
+        self.messages = collections.deque([], QUEUE_LIMIT)
+        self.subscriptions = {}
+        self.subscribed_text = False
+
+        (self.group, self.interface, self.wall) = network_settings(group, interface, wall)
+        self.address = self.group or '<broadcast>'
+        self.sock = open_socket(self.port, self.group, self.interface, ttl, loopback, listen)
+        self.other_walls = 0
 
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-        self.sock.setblocking(0)
-        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # datagrams are read straight into a ring of preallocated
+        # buffers, text payloads stay there until recv() wants them
+        self.ring = [bytearray(MAX_PACKET) for i in range(RING_SLOTS)]
+        self.ring_views = [memoryview(slot) for slot in self.ring]
+        self.ring_busy = [False] * RING_SLOTS
+        self.ring_head = 0
+        self.raw = collections.deque([])
 
-        self.sock.bind(('' , self.port))
+        self.last_drain = DrainStats(0, 0, 0)
+        self.packets_read = 0
+        self.bytes_read = 0
+        self.malformed = 0
+        self.overflowed = 0
+        self.heard = {}
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.sock, selectors.EVENT_READ)
+
+        self.reliable = reliable
+        self.sequence = random.randrange(1 << 30)
+        self.pending = collections.OrderedDict()
+        self.peers = set()
+        self.misses = collections.Counter()
+        self.seen = {}
+        self.retransmits = 0
+        self.failed = 0
+
+    def close(self):
+        self.selector.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def transmit(self, packet, port):
+        self.sock.sendto(packet, (self.address, port))
 
     def send(self, data, port = 0):
         if not port:
             port = self.port
 
-        message = (self.name + ':' + data).encode()
-        self.sock.sendto(message, ('<broadcast>', port))
-    
+        if not self.reliable:
+            self.transmit(encode(self.name, data, legacy=self.legacy, wall=self.wall), port)
+            return
+
+        self.sequence = (self.sequence + 1) & 0xFFFFFFFF or 1
+        packet = encode(self.name, data, self.sequence, self.legacy, self.wall)
+        self.pending[self.sequence] = _Pending(packet, port, set(self.peers))
+        self.transmit(packet, port)
+
+    def receive_ack(self, origin, target, seq):
+        if origin != self.name:
+            self.peers.add(origin)
+            self.misses.pop(origin, None)
+            if target == self.name and seq in self.pending:
+                self.acked(seq, origin)
+
+    def receive_sequenced(self, origin, seq):
+        '''Ack a sequenced packet, return False if it is a duplicate'''
+        if origin != self.name:
+            self.transmit(encode_ack(self.name, origin, seq, self.legacy, self.wall), self.port)
+
+        return not is_duplicate(self.seen, origin, seq)
+
+    def acked(self, seq, peer):
+        pending = self.pending[seq]
+        pending.acked = True
+        pending.waiting.discard(peer)
+        if not pending.waiting and not pending.blind:
+            del self.pending[seq]
+
+    def missed(self, peers):
+        '''Forget peers that have now missed PEER_MISSES sends in a row'''
+        for peer in peers:
+            self.misses[peer] += 1
+            if self.misses[peer] < PEER_MISSES:
+                continue
+            del self.misses[peer]
+            self.peers.discard(peer)
+            for (seq, pending) in list(self.pending.items()):
+                pending.waiting.discard(peer)
+                if not pending.waiting and not pending.blind:
+                    del self.pending[seq]
+
+    def retransmit(self):
+        now = time.monotonic()
+        for (seq, pending) in list(self.pending.items()):
+            if seq not in self.pending or pending.next_time > now:
+                continue    # settled by missed() earlier in this pass, or not due
+            if pending.attempts >= RETRY_LIMIT:
+                del self.pending[seq]
+                if pending.waiting or not pending.acked:
+                    self.failed += 1
+                self.missed(pending.waiting)
+                continue
+            self.transmit(pending.packet, pending.port)
+            self.retransmits += 1
+            pending.attempts += 1
+            pending.interval = min(pending.interval * 2, RETRY_MAX)
+            pending.next_time = now + pending.interval
+
+    def select(self, remaining):
+        '''Sleep on the socket, waking early for any due retransmit'''
+        if self.pending:
+            retry = min(p.next_time for p in self.pending.values()) - time.monotonic()
+            if remaining is None or retry < remaining:
+                remaining = max(retry, 0)
+        self.selector.select(remaining)
+
     def available(self):
+        packets = 0
+        nbytes_total = 0
+        drops = 0
+        overflowed = self.overflowed
+        now = time.monotonic()
+
+        while self.raw and len(self.raw[0]) == 2:
+            self.raw.popleft()
+
         while True:
-            origin = False
-            message = ""
+            head = self.ring_head
+            while self.ring_busy[head]:
+                self.materialize(self.raw.popleft())
 
             try:
-                (data, addr) = self.sock.recvfrom(1024)
-                decoded = data.decode()
-                ( origin, message ) = decoded.split(':', 1)
+                (nbytes, addr) = self.sock.recvfrom_into(self.ring[head])
             except BlockingIOError:
-                pass
-            except ValueError:
-                pass
-
-            if origin == False:
                 break
 
-            self.messages.append( (origin, message) )
+            packets += 1
+            nbytes_total += nbytes
+            view = self.ring_views[head][:nbytes]
+
+            if nbytes and view[0] == FRAME_MAGIC:
+                header = unpack_header(view)
+                if header is None:
+                    drops += 1
+                    continue
+
+                (origin, msg_type, seq, start, end, wall) = header
+                if wall != self.wall:
+                    self.other_walls += 1
+                    continue
+                self.heard[origin] = now
+                if msg_type == TYPE_ACK:
+                    self.receive_ack(origin, str(view[start:end], 'utf-8', 'replace'), seq)
+                    continue
+                if seq is not None and not self.receive_sequenced(origin, seq):
+                    continue
+
+                if msg_type == TYPE_DATA:
+                    entry = [origin, head, start, end]
+                    self.raw.append(entry)
+                    self.ring_busy[head] = True
+                    self.ring_head = (head + 1) % RING_SLOTS
+                    self.deliver(entry)
+                else:
+                    self.deliver((origin, MESSAGE_NAMES[msg_type]))
+                continue
+
+            if self.wall != 0:
+                self.other_walls += 1
+                continue
+
+            packet = decode(view)
+            if packet is None:
+                drops += 1
+                continue
+
+            (origin, message, seq) = packet
+            self.heard[origin] = now
+            if message.startswith(ACK_PREFIX):
+                self.receive_ack(origin, message[len(ACK_PREFIX):], seq)
+            elif seq is None or self.receive_sequenced(origin, seq):
+                self.deliver((origin, message))
+
+        if packets:
+            self.last_drain = DrainStats(packets, nbytes_total,
+                                         drops + self.overflowed - overflowed)
+            self.packets_read += packets
+            self.bytes_read += nbytes_total
+            self.malformed += drops
+
+        if self.pending:
+            self.retransmit()
+
+        return len(self.messages)
+
+    def deliver(self, entry):
+        '''Hand an entry to matching subscribers, or queue it for recv()'''
+        if self.subscriptions:
+            if len(entry) == 4 and self.subscribed_text:
+                entry = self.materialize(entry)
+            if len(entry) == 2:
+                (origin, message) = entry
+                subs = self.subscriptions.get((message, origin), []) + \
+                       self.subscriptions.get((message, None), [])
+                if subs:
+                    for sub in subs:
+                        sub.deliver(origin, message)
+                    return
+
+        self.enqueue(self.messages, entry)
+
+    def enqueue(self, queue, entry):
+        '''Append to a bounded queue, counting the oldest entry if it falls off'''
+        if len(queue) == queue.maxlen:
+            self.overflowed += 1
+        queue.append(entry)
+
+    def subscribe(self, message, origin = None, handler = None):
+        '''Claim message (optionally only from origin) for the caller
+
+        Matching messages skip the general recv() queue.  They are
+        passed to handler(origin, message) from inside available(),
+        or, without a handler, queued on the returned Subscription.'''
+        sub = Subscription(self, message, origin, handler)
+        self.subscriptions.setdefault((message, origin), []).append(sub)
+        if message not in MESSAGE_TYPES:
+            self.subscribed_text = True
+        return sub
+
+    def unsubscribe(self, sub):
+        key = (sub.message, sub.origin)
+        subs = self.subscriptions.get(key, [])
+        if sub in subs:
+            subs.remove(sub)
+        if not subs:
+            self.subscriptions.pop(key, None)
+        self.subscribed_text = any(m not in MESSAGE_TYPES for (m, o) in self.subscriptions)
+
+    def poll(self, ready, timeout = None):
+        '''Service the socket until ready() is true or timeout (seconds) expires'''
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+
+        while True:
+            self.available()
+            if ready():
+                return True
+            if timeout is None:
+                remaining = None
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+            self.select(remaining)
+
+    def materialize(self, entry):
+        '''Decode a queued entry still pointing into the ring, return (origin, message)'''
+        if len(entry) == 4:
+            (origin, slot, start, end) = entry
+            entry[1:] = [str(self.ring_views[slot][start:end], 'utf-8', 'replace')]
+            self.ring_busy[slot] = False
+        return tuple(entry)
 
+    def wait(self, timeout = None):
+        '''Block until a message is queued or timeout (seconds) expires'''
+        self.poll(lambda: self.messages, timeout)
         return len(self.messages)
 
-    
-    def recv(self):
+    def flush(self, timeout = None):
+        '''Keep retransmitting until every reliable send is acked or dropped
+
+        Returns True if nothing is left pending.'''
+        return self.poll(lambda: not self.pending, timeout)
+
+    def recv(self, timeout = 0):
+        if not self.messages and timeout != 0:
+            self.wait(timeout)
+
         try:
-            return self.messages.popleft()
+            return self.materialize(self.messages.popleft())
         except:
             return ("", "")
+
+    def wait_for(self, message, origin = None, timeout = None):
+        '''Block until message (optionally from origin) arrives
+
+        Other messages stay queued for later recv() calls.'''
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+
+        checked = 0
+        while True:
+            self.available()
+            for i in range(checked, len(self.messages)):
+                (msg_origin, msg) = self.materialize(self.messages[i])
+                if msg == message and (origin is None or msg_origin == origin):
+                    del self.messages[i]
+                    return (msg_origin, msg)
+            checked = len(self.messages)
+
+            if timeout is None:
+                remaining = None
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+            self.select(remaining)
+
+
+class _CommsProtocol(asyncio.DatagramProtocol):
+    def __init__(self, messages, wall):
+        self.messages = messages
+        self.wall = wall
+        self.seen = {}
+
+    def datagram_received(self, data, addr):
+        packet = decode(data, self.wall)
+        if packet is None or packet[1].startswith(ACK_PREFIX):
+            return
+
+        (origin, message, seq) = packet
+        if seq is not None and is_duplicate(self.seen, origin, seq):
+            return
+        self.messages.put_nowait((origin, message))
+
+
+class AsyncComms:
+    def __init__(self):
+        pass
+
+    async def begin(self, name, port = DEFAULT_PORT, legacy = False,
+                    group = None, interface = None, wall = None, ttl = MULTICAST_TTL, loopback = True,
+                    listen = True):
+        check_name(name)
+        self.name = name
+        self.port = port
+        self.legacy = legacy
+        self.messages = asyncio.Queue()
+
+        (self.group, self.interface, self.wall) = network_settings(group, interface, wall)
+        self.address = self.group or '<broadcast>'
+        sock = open_socket(self.port, self.group, self.interface, ttl, loopback, listen)
+
+        loop = asyncio.get_running_loop()
+        (self.transport, self.protocol) = await loop.create_datagram_endpoint(
+            lambda: _CommsProtocol(self.messages, self.wall), sock=sock)
+
+    async def send(self, data, port = 0):
+        if not port:
+            port = self.port
+
+        packet = encode(self.name, data, legacy=self.legacy, wall=self.wall)
+        self.transport.sendto(packet, (self.address, port))
+
+    def available(self):
+        return self.messages.qsize()
+
+    async def recv(self, timeout = None):
+        '''Wait for the next (origin, message), ("", "") on timeout'''
+        try:
+            return await asyncio.wait_for(self.messages.get(), timeout)
+        except asyncio.TimeoutError:
+            return ("", "")
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.messages.get()
+
+    def close(self):
+        self.transport.close()
@@ -0,0 +1,109 @@
+'''
+Shared gpiozero device registry
+
+Opening a gpiozero device sets up its pin (and, for inputs, an edge
+detection thread), and closing one tears that down again, which
+costs a few hundred ms a game and risks racing the release of a pin
+that is about to be reopened.  Panels instead ask this module for
+their devices: each pin is opened once per process and handed back
+on every later request, and between games reset() puts everything
+back the way it was opened rather than closing it.
+
+1. Get devices by pin, or a whole name -> pin table at once
+    from utils import hardware
+    coin = hardware.button(5, bounce_time=0.01)
+    ports = hardware.buttons({4: 'NewAmsterdam', 17: 'Lima'})
+    ports['Lima'].when_pressed = ...
+
+2. At the end of every game
+    hardware.reset()
+
+   Inputs lose their when_* callbacks, outputs are switched off
+   (motors stopped, servos detached).  Asking for a pin that is
+   already open as a different device, or with different options,
+   raises ValueError.
+'''
+
+import gpiozero
+
+CALLBACKS = ('when_pressed', 'when_released', 'when_held',
+             'when_activated', 'when_deactivated')
+
+
+class DeviceRegistry(object):
+    def __init__(self):
+        self.devices = {}   # pin (or tuple of pins) -> (device class, options, device)
+
+    def get(self, cls, pin, **options):
+        '''The device on pin, opening it the first time it is asked for'''
+        entry = self.devices.get(pin)
+        if entry is None:
+            if isinstance(pin, tuple):
+                device = cls(*pin, **options)   # e.g. PhaseEnableMotor(dir, step)
+            else:
+                device = cls(pin, **options)
+            self.devices[pin] = (cls, options, device)
+            return device
+
+        (open_cls, open_options, device) = entry
+        if open_cls is not cls or open_options != options:
+            raise ValueError('GPIO{0} is already open as {1}{2}'.format(
+                pin, open_cls.__name__, open_options or ''))
+        return device
+
+    def named(self, cls, mapping, **options):
+        '''Devices for a {pin: name} table, keyed by name'''
+        return dict((name, self.get(cls, pin, **options)) for (pin, name) in mapping.items())
+
+    def reset(self):
+        for (cls, options, device) in self.devices.values():
+            reset_device(device)
+
+    def close(self):
+        for (cls, options, device) in self.devices.values():
+            device.close()
+        self.devices = {}
+
+
+def reset_device(device):
+    for callback in CALLBACKS:
+        if getattr(device, callback, None) is not None:
+            setattr(device, callback, None)
+    if hasattr(device, 'detach'):
+        device.detach()
+    elif hasattr(device, 'stop'):
+        device.stop()
+    elif hasattr(device, 'off'):
+        device.off()
+
+
+# the one registry every panel in this process shares
+registry = DeviceRegistry()
+
+
+def button(pin, **options):
+    return registry.get(gpiozero.Button, pin, **options)
+
+
+def led(pin, **options):
+    return registry.get(gpiozero.LED, pin, **options)
+
+
+def buttons(mapping, **options):
+    return registry.named(gpiozero.Button, mapping, **options)
+
+
+def leds(mapping, **options):
+    return registry.named(gpiozero.LED, mapping, **options)
+
+
+def device(cls, pin, **options):
+    return registry.get(cls, pin, **options)
+
+
+def reset():
+    registry.reset()
+
+
+def close():
+    registry.close()
@@ -0,0 +1,103 @@
+'''
+Frame buffer for NeoPixel strips
+
+Every Adafruit_NeoPixel.show() is a full DMA transfer of the strip,
+whether or not anything changed.  FrameBuffer wraps a strip with a
+shadow copy of its pixels, remembers the span of pixels touched since
+the last show() and what was last pushed to the strip, so:
+
+    strip = FrameBuffer(Adafruit_NeoPixel(...), max_fps=60)
+    strip.begin()
+    strip.setPixelColor(0, Color(255, 0, 0))
+    strip.show()        # pushes pixel 0
+    strip.setPixelColor(0, Color(255, 0, 0))
+    strip.show()        # nothing changed, skipped
+
+A pixel set to a new color and back again before the show() counts
+as unchanged, and only pixels that differ from what the strip last
+showed are copied into it before a real show.
+With max_fps, a show() that comes too soon after the last one waits
+out the rest of the frame rather than being dropped, so the last
+frame always reaches the strip.  A show() with nothing to push
+returns at once, so a loop that redraws the same frame still needs
+its own sleep.
+
+shows and skipped count the show() calls that were pushed and those
+that had nothing to push.
+'''
+
+import time
+from array import array
+
+
+class FrameBuffer(object):
+    def __init__(self, strip, max_fps=None):
+        self.strip = strip
+        self.count = strip.numPixels()
+        self.pixels = array('I', [0] * self.count)
+        self.shown = array('I', [0] * self.count)     # as last pushed to the strip
+        self.dirty_start = self.count   # touched span is [dirty_start, dirty_end)
+        self.dirty_end = 0
+        self.brightness_changed = False
+        self.frame_time = 1.0 / max_fps if max_fps else 0
+        self.last_show = 0
+        self.shows = 0
+        self.skipped = 0
+
+    def begin(self):
+        self.strip.begin()
+
+    def numPixels(self):
+        return self.count
+
+    def getPixelColor(self, n):
+        return self.pixels[n]
+
+    def setPixelColor(self, n, color):
+        if self.pixels[n] == color:
+            return
+        self.pixels[n] = color
+        if n < self.dirty_start:
+            self.dirty_start = n
+        if n >= self.dirty_end:
+            self.dirty_end = n + 1
+
+    def fill(self, color, start=0, end=None):
+        for n in range(start, self.count if end is None else end):
+            self.setPixelColor(n, color)
+
+    def setBrightness(self, brightness):
+        # changes every pixel on the strip, so the next show() must push
+        self.strip.setBrightness(brightness)
+        self.brightness_changed = True
+
+    def changed(self):
+        '''Pixels that differ from what the strip last showed'''
+        return [n for n in range(self.dirty_start, self.dirty_end)
+                if self.pixels[n] != self.shown[n]]
+
+    def show(self):
+        '''Push any changed pixels to the strip, True if a show was issued'''
+        changed = self.changed()
+        self.dirty_start = self.count
+        self.dirty_end = 0
+        if not changed and not self.brightness_changed:
+            self.skipped += 1
+            return False
+
+        if self.frame_time:
+            wait = self.last_show + self.frame_time - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+        for n in changed:
+            self.strip.setPixelColor(n, self.pixels[n])
+            self.shown[n] = self.pixels[n]
+        self.strip.show()
+        self.last_show = time.monotonic()
+        self.brightness_changed = False
+        self.shows += 1
+        return True
+
+    def stats(self):
+        return 'LED shows: {0} issued, {1} skipped'.format(self.shows, self.skipped)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+'''
+Loopback harness for the reliable Comms mode
+
+Runs one sender and several receivers in this process on a
+spare port, drops a configurable fraction of every packet sent
+(data and acks alike), then reports how many messages arrived
+and the delivery latency percentiles.
+
+    python3 -m utils.loopback --loss 0.2 --count 200 --peers 3
+
+With --group the same run goes over multicast instead of
+broadcast; pair it with '--interface lo' to exercise multicast
+without any external network.
+
+    python3 -m utils.loopback --group 239.77.79.70 --interface lo
+'''
+
+import argparse
+import random
+import threading
+import time
+from utils import comms
+
+
+class LossyComms(comms.Comms):
+    def __init__(self, loss, rng):
+        self.loss = loss
+        self.rng = rng
+        self.dropped = 0
+
+    def transmit(self, packet, port):
+        if self.rng.random() < self.loss:
+            self.dropped += 1
+            return
+        super().transmit(packet, port)
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    index = int(round(pct / 100.0 * (len(values) - 1)))
+    return values[index]
+
+
+def receive_loop(receiver, arrivals, stop):
+    while not stop.is_set():
+        (origin, message) = receiver.recv(timeout=0.05)
+        if origin == 'sender' and message not in arrivals:
+            arrivals[message] = time.monotonic()
+
+
+def run(args):
+    rng = random.Random(args.seed)
+
+    sender = LossyComms(args.loss, rng)
+    sender.begin('sender', args.port, reliable=True,
+                 group=args.group, interface=args.interface, wall=args.wall)
+
+    receivers = []
+    threads = []
+    stop = threading.Event()
+    for i in range(args.peers):
+        receiver = LossyComms(args.loss, rng)
+        receiver.begin('peer%d' % i, args.port,
+                       group=args.group, interface=args.interface, wall=args.wall)
+        arrivals = {}
+        thread = threading.Thread(target=receive_loop, args=(receiver, arrivals, stop))
+        thread.start()
+        receivers.append((receiver, arrivals))
+        threads.append(thread)
+
+    sent = {}
+    for n in range(args.count):
+        message = 'MSG %d' % n
+        sent[message] = time.monotonic()
+        sender.send(message)
+
+        until = time.monotonic() + args.interval
+        while time.monotonic() < until:
+            sender.wait(until - time.monotonic())
+            sender.messages.clear()
+
+    sender.flush(timeout=10)
+    time.sleep(0.1)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies = []
+    delivered = 0
+    for (receiver, arrivals) in receivers:
+        for (message, arrived) in arrivals.items():
+            latencies.append((arrived - sent[message]) * 1000.0)
+        delivered += len(arrivals)
+    latencies.sort()
+
+    expected = args.count * args.peers
+    dropped = sender.dropped + sum(r.dropped for (r, a) in receivers)
+    print('loss {0:.0%}: delivered {1}/{2} ({3:.1%})'.format(
+        args.loss, delivered, expected, float(delivered) / expected))
+    print('packets dropped {0}, retransmits {1}, gave up {2}'.format(
+        dropped, sender.retransmits, sender.failed))
+    print('latency ms  p50 {0:.2f}  p90 {1:.2f}  p99 {2:.2f}  max {3:.2f}'.format(
+        percentile(latencies, 50), percentile(latencies, 90),
+        percentile(latencies, 99), percentile(latencies, 100)))
+
+
+def run_main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-l', '--loss', type=float, default=0.1, help='fraction of packets to drop (0-1)')
+    parser.add_argument('-c', '--count', type=int, default=100, help='number of messages to send')
+    parser.add_argument('-n', '--peers', type=int, default=2, help='number of receiving panels')
+    parser.add_argument('-i', '--interval', type=float, default=0.01, help='seconds between sends')
+    parser.add_argument('-p', '--port', type=int, default=comms.DEFAULT_PORT + 1, help='network port to use')
+    parser.add_argument('-s', '--seed', type=int, default=None, help='random seed for packet loss')
+    parser.add_argument('-g', '--group', action='store', help='multicast group to use instead of broadcast')
+    parser.add_argument('-I', '--interface', action='store', help='network interface to bind, e.g. lo')
+    parser.add_argument('-w', '--wall', type=int, default=0, help='wall id to tag frames with')
+    run(parser.parse_args())
+
+
+# Main program logic follows:
+if __name__ == '__main__':
+    run_main()
@@ -20,21 +20,38 @@ def run_main():
     parser.add_argument('-n', '--name', action='store', help='set source name, defaults to admin')
     parser.add_argument('-p', '--port', action='store', help='network port to use, use default if not specified')
     parser.add_argument('-m', '--message', action='store', help='message to send', required=True)
+    parser.add_argument('-r', '--reliable', action='store_true', help='retransmit until the panels acknowledge')
+    parser.add_argument('-g', '--group', action='store', help='multicast group to send to instead of broadcasting')
+    parser.add_argument('-i', '--interface', action='store', help='network interface to send from')
+    parser.add_argument('-w', '--wall', action='store', help='wall id, for several walls on one network')
 
     args = parser.parse_args()
 
     wof = comms.Comms()
 
+    wall = None
+    if args.wall:
+        wall = int(args.wall)
+
     if args.name:
-        wof.begin(args.name)
+        name = args.name
     else:
-        wof.begin('admin')
+        name = 'admin'
+
+    # only a reliable send needs to hear the panels' acks
+    wof.begin(name, reliable=args.reliable, group=args.group, interface=args.interface, wall=wall,
+              listen=args.reliable)
 
     if args.port:
         wof.send(args.message, int(args.port))
     else:
         wof.send(args.message)
 
+    if args.reliable:
+        wof.flush(timeout=10)
+
+    wof.close()
+
 
 # Main program logic follows:
 if __name__ == '__main__':
@@ -0,0 +1,220 @@
+'''
+Background audio for xy_chase
+
+Every clip in the audio directory is decoded once at start-up (.ogg
+through oggdec, .wav read directly) and kept in memory as PCM.  A
+single player thread feeds the clips to one long-running aplay per
+sample format, a block at a time, so the game never waits on audio
+unless it asks to:
+
+    audio = AudioEngine(os.path.join(os.getenv('XY_DIR'), 'audio'))
+    audio.play('StormAtSea.ogg')                  # queue it, carry on
+    audio.play('PirateWon.ogg').result()          # queue it and wait
+    audio.play('PirateLost.ogg', interrupt=True)  # drop everything else
+
+play() returns a concurrent.futures.Future that resolves to True once
+the whole clip has played, or False if it was cut short; clips dropped
+from the queue before starting are cancelled.  Clips play one after
+another in priority order; queueing a clip with a higher priority than
+the one playing cuts the playing one off.  Writes are paced against
+the clock, so at most LEAD_TIME of a cut clip is still heard.
+'''
+
+import concurrent.futures
+import fcntl
+import heapq
+import itertools
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import wave
+
+BLOCK_TIME  = 0.05      # seconds of audio per write
+LEAD_TIME   = 0.1       # how far writes may run ahead of playback
+BUFFER_TIME = 100000    # aplay's buffer, microseconds
+PIPE_SIZE   = 4096      # keep little audio queued in the pipe to aplay
+SAMPLE_FORMATS = {1: 'U8', 2: 'S16_LE', 3: 'S24_3LE', 4: 'S32_LE'}
+
+
+class Clip(object):
+    def __init__(self, name, data, rate, channels, width):
+        self.name = name
+        self.data = data
+        self.format = (rate, channels, width)
+        self.duration = len(data) / float(rate * channels * width)
+
+
+def read_wave(path, name):
+    with wave.open(path, 'rb') as w:
+        return Clip(name, w.readframes(w.getnframes()),
+                    w.getframerate(), w.getnchannels(), w.getsampwidth())
+
+
+def decode_ogg(path, name):
+    (fd, wav_path) = tempfile.mkstemp(suffix='.wav')
+    os.close(fd)
+    try:
+        subprocess.check_call(['oggdec', '--quiet', '--output', wav_path, path])
+        return read_wave(wav_path, name)
+    finally:
+        os.unlink(wav_path)
+
+
+def load_clips(audio_dir):
+    '''Decode every .ogg and .wav clip in audio_dir, keyed by file name'''
+    clips = {}
+    for name in sorted(os.listdir(audio_dir)):
+        path = os.path.join(audio_dir, name)
+        if name.endswith('.ogg'):
+            clips[name] = decode_ogg(path, name)
+        elif name.endswith('.wav'):
+            clips[name] = read_wave(path, name)
+    return clips
+
+
+def aplay_command(rate, channels, width):
+    return ['aplay', '-q', '-t', 'raw', '-f', SAMPLE_FORMATS[width],
+            '-c', str(channels), '-r', str(rate), '--buffer-time=%d' % BUFFER_TIME]
+
+
+class AudioEngine(object):
+    def __init__(self, audio_dir, player=aplay_command):
+        self.clips = load_clips(audio_dir)
+        self.player = player
+        self.outputs = {}
+        self.queue = []
+        self.order = itertools.count()
+        self.lock = threading.Condition()
+        self.playing = None     # (priority, clip) on the player thread
+        self.cut = False
+        self.closed = False
+        self.played = 0
+        self.interrupted = 0
+
+        self.thread = threading.Thread(target=self.run, name='audio', daemon=True)
+        self.thread.start()
+
+    def play(self, name, priority=0, interrupt=False):
+        '''Queue a clip, returning a Future for when it is done playing'''
+        if name not in self.clips:
+            raise ValueError('no audio clip named {0}'.format(name))
+
+        future = concurrent.futures.Future()
+        with self.lock:
+            if self.closed:
+                raise RuntimeError('audio engine is closed')
+            if interrupt:
+                self.drop_queue()
+            if self.playing is not None and (interrupt or priority > self.playing[0]):
+                self.cut = True
+            heapq.heappush(self.queue, (-priority, next(self.order), self.clips[name], future))
+            self.lock.notify_all()
+        return future
+
+    def stop(self):
+        '''Cut off the clip that is playing and drop everything queued'''
+        with self.lock:
+            self.drop_queue()
+            if self.playing is not None:
+                self.cut = True
+                self.lock.notify_all()
+
+    def drop_queue(self):
+        for (priority, order, clip, future) in self.queue:
+            future.cancel()
+        self.queue = []
+
+    def busy(self):
+        with self.lock:
+            return self.playing is not None or bool(self.queue)
+
+    def run(self):
+        while True:
+            with self.lock:
+                while not self.queue and not self.closed:
+                    self.lock.wait()
+                if self.closed:
+                    return
+                (priority, order, clip, future) = heapq.heappop(self.queue)
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self.playing = (-priority, clip)
+                self.cut = False
+
+            try:
+                finished = self.stream(clip)
+            except Exception as e:
+                with self.lock:
+                    self.playing = None
+                future.set_exception(e)
+                continue
+
+            with self.lock:
+                self.playing = None
+                if finished:
+                    self.played += 1
+                else:
+                    self.interrupted += 1
+            future.set_result(finished)
+
+    def stream(self, clip):
+        output = self.output(clip.format)
+        (rate, channels, width) = clip.format
+        rate = float(rate * channels * width)
+        block = max(int(rate * BLOCK_TIME) // (channels * width), 1) * channels * width
+        data = memoryview(clip.data)
+        started = time.monotonic()
+
+        # keep no more than LEAD_TIME of audio ahead of the speaker, so
+        # a cut is heard promptly, and once it is all written wait out
+        # the rest so the Future resolves when the clip has been heard
+        for start in range(0, len(data), block):
+            if not self.wait_until(started + start / rate - LEAD_TIME):
+                return False
+            output.write(data[start:start + block])
+            output.flush()
+        return self.wait_until(started + len(data) / rate)
+
+    def wait_until(self, deadline):
+        '''Sleep until deadline, False if the clip is cut off first'''
+        with self.lock:
+            while not (self.cut or self.closed):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return True
+                self.lock.wait(remaining)
+            return False
+
+    def output(self, format):
+        '''The player's stdin for this sample format, started on first use'''
+        process = self.outputs.get(format)
+        if process is None or process.poll() is not None:
+            process = subprocess.Popen(self.player(*format), stdin=subprocess.PIPE)
+            try:
+                fcntl.fcntl(process.stdin.fileno(), getattr(fcntl, 'F_SETPIPE_SZ', 1031), PIPE_SIZE)
+            except OSError:
+                pass
+            self.outputs[format] = process
+        return process.stdin
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.drop_queue()
+            self.lock.notify_all()
+        self.thread.join()
+        for process in self.outputs.values():
+            try:
+                process.stdin.close()
+            except (IOError, OSError):
+                pass
+            process.wait()
+        self.outputs = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# Replay scripted button timelines through XyChase in simulated time,
+# so a whole 60s chase runs in milliseconds and comes out the same
+# every time.  Pins are gpiozero's MockFactory, clips finish the moment
+# they are queued, and the clock only moves when the game would
+# otherwise block: to the next scripted press or the next timer.
+#
+#   python3 chase_sim.py [--route N] [--scenario NAME]
+
+import argparse
+import concurrent.futures
+import os
+import queue
+import sys
+import time
+from gpiozero import Device
+from gpiozero.pins.mock import MockFactory
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import xy_chase
+from routes import ROUTES_FILE, load_routes
+
+BUTTON_PINS = dict((name, pin) for (pin, name) in xy_chase.HALL_MAPPING.items())
+CLIP_TIME = 2.0
+
+
+# presses as (seconds after the introduction, which stop on the route);
+# 'wrong' presses a port that is not on the route
+SCENARIOS = {
+    'win':       ([(5, 0), (12, 1), (20, 2)], 'CARTDONE', 22),
+    'photo':     ([(1, 0), (2, 1), (3, 2)], 'CARTDONE', 5),
+    'timeout':   ([(5, 0), (40, 1), (70, 2)], 'RESET', 60),
+    'idle':      ([], 'RESET', 60),
+    'order':     ([(3, 1), (4, 2), (6, 0), (9, 2), (12, 1), (15, 2)], 'CARTDONE', 17),
+    'wrong':     ([(2, 'wrong'), (4, 0), (5, 'wrong'), (8, 1), (30, 2)], 'CARTDONE', 32),
+    'last-gasp': ([(10, 0), (20, 1), (59.9, 2)], 'CARTDONE', 61.9),
+}
+
+
+class SimClock(object):
+    '''Simulated time that jumps to the next scripted press or deadline'''
+
+    def __init__(self, presses):
+        self.time = 0.0
+        self.presses = sorted(presses)
+
+    def now(self):
+        return self.time
+
+    def wait(self, events, timeout):
+        try:
+            return events.get_nowait()
+        except queue.Empty:
+            pass
+
+        deadline = None if timeout is None else self.time + timeout
+        if self.presses and (deadline is None or self.presses[0][0] <= deadline):
+            (at, port) = self.presses.pop(0)
+            self.time = max(self.time, at)
+            pin = Device.pin_factory.pin(BUTTON_PINS[port])
+            pin.drive_low()
+            pin.drive_high()
+            return events.get(timeout=1)
+        if deadline is None:
+            raise RuntimeError('simulation stuck at %.1fs with nothing to wait for' % self.time)
+        self.time = deadline
+        return None
+
+
+class SimClip(object):
+    duration = CLIP_TIME
+
+
+class SimAudio(object):
+    '''Every clip exists and is over as soon as it is queued'''
+
+    def __init__(self):
+        self.clips = {}
+        self.log = []
+
+    def play(self, name, priority=0, interrupt=False):
+        self.clips.setdefault(name, SimClip())
+        self.log.append(name)
+        future = concurrent.futures.Future()
+        future.set_result(True)
+        return future
+
+
+class SimComms(object):
+    def __init__(self, clock):
+        self.clock = clock
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append((message, self.clock.now()))
+
+
+def run(routes, route, scenario):
+    (timeline, expected, expected_at) = SCENARIOS[scenario]
+    stops = [stage.port for stage in routes[route]]
+    wrong = [port for port in BUTTON_PINS if port not in stops][0]
+    presses = [(at, wrong if stop == 'wrong' else stops[stop]) for (at, stop) in timeline]
+
+    clock = SimClock(presses)
+    comms = SimComms(clock)
+    audio = SimAudio()
+    chase = xy_chase.XyChase(comms, audio, routes, clock)
+    chase.current_route = route
+
+    start = time.time()
+    chase.begin_game()
+    elapsed = time.time() - start
+
+    ok = comms.sent == [(expected, expected_at)]
+    print('%-10s route %d  sent %-24s %6d events  %7.1fms  %s' % (
+        scenario, route, comms.sent, chase.loop.dispatched, elapsed * 1000,
+        'ok' if ok else 'FAILED, expected %s at %gs' % (expected, expected_at)))
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-r', '--route', type=int, help='route number (default: all)')
+    parser.add_argument('-s', '--scenario', choices=sorted(SCENARIOS), help='scenario (default: all)')
+    parser.add_argument('-f', '--file', default=ROUTES_FILE, help='routes.json to play')
+    args = parser.parse_args()
+
+    Device.pin_factory = MockFactory()
+    routes = load_routes(args.file, xy_chase.LED_MAPPING, xy_chase.HALL_MAPPING)
+    # the scripted timelines are written for three-stop routes
+    numbers = [args.route] if args.route is not None else range(len(routes))
+    numbers = [n for n in numbers if len(routes[n]) == 3]
+    scenarios = [args.scenario] if args.scenario else sorted(SCENARIOS)
+
+    results = [run(routes, route, scenario) for route in numbers for scenario in scenarios]
+    print('%d of %d runs as expected' % (sum(results), len(results)))
+    sys.exit(0 if all(results) else 1)
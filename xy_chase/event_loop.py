@@ -0,0 +1,116 @@
+'''
+Event queue and timers for the chase
+
+Everything the game reacts to arrives as an event on one queue:
+button presses (posted from gpiozero's callback thread), clips
+finishing (posted from the audio thread) and timers coming due.  The
+game thread blocks until the next event or the nearest timer, so it
+sleeps between presses instead of spinning, and all game state is
+only ever touched from that one thread.
+
+    loop = EventLoop()
+    loop.on('pressed', handle_press)
+    button.when_pressed = loop.poster('pressed', 'Lima')
+    timeout = loop.call_later(60, lose_game)
+    loop.run()                      # until something calls loop.stop()
+
+Timers are kept in a heap ordered by deadline; the chase never has
+more than a handful pending, so that beats a timer wheel.  Time comes
+from the clock passed in, which is what lets chase_sim.py replay a
+game in simulated time.
+'''
+
+import heapq
+import itertools
+import queue
+import time
+
+
+class Clock(object):
+    '''Wall-clock time, waiting on the real event queue'''
+
+    def now(self):
+        return time.monotonic()
+
+    def wait(self, events, timeout):
+        '''Next event from the queue, or None once timeout seconds pass'''
+        try:
+            return events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class Timer(object):
+    def __init__(self, deadline, callback, args):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class EventLoop(object):
+    def __init__(self, clock=None):
+        self.clock = clock or Clock()
+        self.events = queue.Queue()
+        self.timers = []
+        self.order = itertools.count()
+        self.handlers = {}
+        self.running = False
+        self.dispatched = 0
+
+    def on(self, name, handler):
+        self.handlers[name] = handler
+
+    def post(self, name, *args):
+        '''Queue an event; safe to call from any thread'''
+        self.events.put((name, args))
+
+    def poster(self, name, *args):
+        '''A callback that posts the event, for gpiozero when_pressed and friends'''
+        return lambda *ignored: self.post(name, *args)
+
+    def call_later(self, delay, callback, *args):
+        '''Run callback on the game thread after delay seconds; game thread only'''
+        timer = Timer(self.clock.now() + delay, callback, args)
+        heapq.heappush(self.timers, (timer.deadline, next(self.order), timer))
+        return timer
+
+    def fire_timers(self):
+        while self.running and self.timers:
+            (deadline, order, timer) = self.timers[0]
+            if not timer.cancelled and deadline > self.clock.now():
+                return
+            heapq.heappop(self.timers)
+            if not timer.cancelled:
+                self.dispatched += 1
+                timer.callback(*timer.args)
+
+    def next_timeout(self):
+        while self.timers and self.timers[0][2].cancelled:
+            heapq.heappop(self.timers)
+        if not self.timers:
+            return None
+        return max(self.timers[0][0] - self.clock.now(), 0)
+
+    def run(self):
+        self.running = True
+        while self.running:
+            self.fire_timers()
+            if not self.running:
+                break
+            event = self.clock.wait(self.events, self.next_timeout())
+            if event is None:
+                continue
+            (name, args) = event
+            handler = self.handlers.get(name)
+            if handler is None:
+                print('Unhandled event: {0}'.format(name))
+                continue
+            self.dispatched += 1
+            handler(*args)
+
+    def stop(self):
+        self.running = False
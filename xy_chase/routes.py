@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+'''
+Routes for the chase, loaded from routes.json
+
+Each route is a list of ports to sail to.  The stages say what
+happens on arrival at each stop: "first" for the pickup, "last" for
+the delivery and "middle" for every storm in between, so a route can
+be any length from two stops up.  Clip names may use {port} (the stop
+being sailed to) and {next} (the one after it); "hint" lights the
+next stop's LED until that many seconds after the stage's first clip.
+
+Everything is checked against LED_MAPPING and HALL_MAPPING (and the
+loaded clips, if given) when the file is loaded, and every route is
+turned into a table of Stages up front, so the game only ever looks
+up route[stop].
+
+    routes = load_routes('routes.json', LED_MAPPING, HALL_MAPPING, audio.clips)
+    stage = routes[n][stop]
+
+Run directly to print balanced random routes for routes.json:
+
+    python3 routes.py --count 12 --length 4
+'''
+
+import argparse
+import json
+import os
+import random
+
+ROUTES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'routes.json')
+STAGE_KEYS = ('clips', 'hint')
+
+
+class Stage(object):
+    def __init__(self, port, led_pin, hall_pin, clips, hint=None, hint_time=0):
+        self.port = port            # destination name, also the hall sensor to wait for
+        self.led_pin = led_pin
+        self.hall_pin = hall_pin
+        self.clips = clips          # played in order on arrival at the stage
+        self.hint = hint            # port to light as a decoy, or None
+        self.hint_time = hint_time
+
+    def __repr__(self):
+        return 'Stage({0})'.format(self.port)
+
+
+def pins_by_name(mapping):
+    return dict((name, pin) for (pin, name) in mapping.items())
+
+
+def build_stages(route, stages, led_pins, hall_pins):
+    table = []
+    for (n, port) in enumerate(route):
+        if n == 0:
+            spec = stages['first']
+        elif n == len(route) - 1:
+            spec = stages['last']
+        else:
+            spec = stages['middle']
+        following = route[n + 1] if n + 1 < len(route) else None
+
+        clips = []
+        for clip in spec['clips']:
+            if '{next}' in clip and following is None:
+                raise ValueError('clip {0} needs a next stop'.format(clip))
+            clips.append(clip.format(port=port, next=following))
+
+        hint = None
+        if spec.get('hint') is not None:
+            if following is None:
+                raise ValueError('a hint needs a next stop')
+            hint = following
+        table.append(Stage(port, led_pins[port], hall_pins[port], tuple(clips),
+                           hint, spec.get('hint', 0)))
+    return table
+
+
+def check_config(config, led_pins, hall_pins):
+    for part in ('stages', 'routes'):
+        if part not in config:
+            raise ValueError('missing "{0}"'.format(part))
+    for name in ('first', 'middle', 'last'):
+        spec = config['stages'].get(name)
+        if spec is None or not spec.get('clips'):
+            raise ValueError('stage "{0}" needs some clips'.format(name))
+        for key in spec:
+            if key not in STAGE_KEYS:
+                raise ValueError('stage "{0}" has unknown setting "{1}"'.format(name, key))
+    if not config['routes']:
+        raise ValueError('no routes')
+
+    for port in config.get('ports', []):
+        if port not in led_pins or port not in hall_pins:
+            raise ValueError('port {0} has no LED and hall sensor'.format(port))
+    for (n, route) in enumerate(config['routes']):
+        if len(route) < 2:
+            raise ValueError('route {0} needs at least two stops'.format(n))
+        for (stop, port) in enumerate(route):
+            if port not in led_pins or port not in hall_pins:
+                raise ValueError('route {0}: {1} has no LED and hall sensor'.format(n, port))
+            if stop and route[stop - 1] == port:
+                raise ValueError('route {0}: {1} twice in a row'.format(n, port))
+
+
+def load_routes(path, led_mapping, hall_mapping, clips=None):
+    '''Load, check and precompute every route in path, as lists of Stages'''
+    with open(path) as f:
+        config = json.load(f)
+    led_pins = pins_by_name(led_mapping)
+    hall_pins = pins_by_name(hall_mapping)
+
+    try:
+        check_config(config, led_pins, hall_pins)
+        routes = [build_stages(route, config['stages'], led_pins, hall_pins)
+                  for route in config['routes']]
+    except ValueError as e:
+        raise ValueError('{0}: {1}'.format(path, e))
+
+    if clips is not None:
+        missing = set(clip for route in routes for stage in route for clip in stage.clips
+                      if clip not in clips)
+        if missing:
+            raise ValueError('{0}: no audio for {1}'.format(path, ', '.join(sorted(missing))))
+    return routes
+
+
+def generate_routes(ports, count, length, rng=random):
+    '''count routes of length stops, spreading every port evenly over every position
+
+    Each stop is picked from the ports used least often at that
+    position so far that are not already on the route (or, on routes
+    longer than the port list, not the stop just before).'''
+    if len(ports) < 2:
+        raise ValueError('need at least two ports')
+    used = [dict((port, 0) for port in ports) for stop in range(length)]
+    routes = []
+    for n in range(count):
+        route = []
+        for stop in range(length):
+            allowed = [port for port in ports if port not in route]
+            if not allowed:
+                allowed = [port for port in ports if port != route[-1]]
+            fewest = min(used[stop][port] for port in allowed)
+            port = rng.choice([port for port in allowed if used[stop][port] == fewest])
+            used[stop][port] += 1
+            route.append(port)
+        routes.append(route)
+    return routes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', '--count', type=int, default=7, help='number of routes')
+    parser.add_argument('-l', '--length', type=int, default=3, help='stops per route')
+    parser.add_argument('-s', '--seed', type=int, help='random seed')
+    parser.add_argument('-f', '--file', default=ROUTES_FILE, help='routes.json to take the ports from')
+    args = parser.parse_args()
+
+    with open(args.file) as f:
+        config = json.load(f)
+    ports = config.get('ports') or sorted(set(port for route in config['routes'] for port in route))
+    routes = generate_routes(ports, args.count, args.length, random.Random(args.seed))
+    print(json.dumps(routes, indent=4))
@@ -1,23 +1,13 @@
 #!/usr/bin/env python3
 from time import sleep
-from utils import comms
-import time
+from utils import comms, hardware
 import os
 import sys
-import subprocess
 import datetime
 import random
-from gpiozero import LED, Button
-
-ROUTES = [
-['NewAmsterdam','Capetown','London'],
-['Lima','Capetown','Venice'],
-['Lima','Venice','NewAmsterdam'],
-['London','Capetown','Lima'],
-['Venice','Capetown','NewAmsterdam'],
-['Capetown','Lima','NewAmsterdam'],
-['Venice','London','Lima']
-]
+from audio_engine import AudioEngine
+from event_loop import EventLoop
+from routes import ROUTES_FILE, load_routes
 
 LED_MAPPING = {
         25 : 'NewAmsterdam',
@@ -41,177 +31,143 @@ HALL_MAPPING = {
 
 TIMEOUT = 60
 
-def send_signal(message):
-    wof = comms.Comms()
-    wof.begin('cartography')
-    wof.send(message)
-
-def read_introduction():
-    play_static_audio('YouAreTheCaptain.ogg')
-
-def play_static_audio(file_name):
+def load_audio():
     root_path = os.getenv('XY_DIR')
-    file_path = '%s/audio/%s' % (root_path, file_name)
-    subprocess.call(['ogg123',file_path])
+    return AudioEngine('%s/audio' % (root_path))
 
 
 class XyChase(object):
-    def __init__(self):
+    def __init__(self, comm_client, audio, routes, clock=None):
         print('A new chase begins')
+        self.communications = comm_client
+        self.audio = audio
+        self.routes = routes
+        self.loop = EventLoop(clock)
+        self.loop.on('start', self.start_clock)
+        self.loop.on('pressed', self.arrived)
+        self.loop.on('armed', self.arm_stage)
+        self.loop.on('finished', self.finish)
+        self.timeout = None
+        self.timers = []
+        self.hint_timer = None
+        self.armed = False
+        self.over = False
         self.initiate_buttons()
         self.initiate_leds()
         self.create_mapping()
         self.routes_completed = 0
-        self.current_route = random.randint(0,6)
+        self.current_route = random.randrange(len(routes))
         self.current_destination = 0
-        self.route_status = [ 'Uninitiated', 'Uninitiated', 'Uninitiated' ]
 
 
     def initiate_buttons(self):
-        self.button1 = Button(4)
-        self.button2 = Button(17)
-        self.button3 = Button(18)
-        self.button4 = Button(27)
-        self.button5 = Button(22)
-        self.button6 = Button(23)
-        self.button7 = Button(24)
+        # opened once per process, reset rather than closed between games
+        self.buttons = hardware.buttons(HALL_MAPPING)
 
     def initiate_leds(self):
-        self.led1 = LED(25)
-        self.led2 = LED(5)
-        self.led3 = LED(6)
-        self.led4 = LED(12)
-        self.led5 = LED(13)
-        self.led6 = LED(19)
-        self.led7 = LED(26)
+        self.leds = hardware.leds(LED_MAPPING)
 
     def cleanup_hardware(self):
-        self.close_buttons()
-        self.close_leds()
-
-    def close_buttons(self):
-        self.button1.close()
-        self.button2.close()
-        self.button3.close()
-        self.button4.close()
-        self.button5.close()
-        self.button6.close()
-        self.button7.close()
-
-    def close_leds(self):
-        self.led1.close()
-        self.led2.close()
-        self.led3.close()
-        self.led4.close()
-        self.led5.close()
-        self.led6.close()
-        self.led7.close()
+        hardware.reset()
 
     def create_mapping(self):
-        self.mapping = {
-                'NewAmsterdam' : [self.button1, self.led1],
-                'Lima' : [self.button2, self.led2],
-                'BuenosAires' : [self.button3, self.led3],
-                'London' : [self.button4, self.led4],
-                'Venice' : [self.button5, self.led5],
-                'Capetown' : [self.button6, self.led6],
-                'Ceylon' : [self.button7, self.led7]
-                }
-
-    def next_destination(self):
-        destination = ROUTES[self.current_route][self.current_destination]
-        self.route_status[self.current_destination] = 'Completed'
-        self.mapping[destination][0].when_pressed = None
-        self.mapping[destination][1].off()
-        self.current_destination += 1
-
-    def pickup_cargo(self):
-        destination = ROUTES[self.current_route][self.current_destination]
-        cargo_file = 'TakeCargo%s.ogg' % (destination)
-        play_static_audio(cargo_file)
-        self.mapping[destination][0].when_pressed = self.next_destination
-        sleep(0.5)
-        self.mapping[destination][1].on()
-        self.route_status[self.current_destination] = 'InProgress'
-
-    def safe_harbor(self):
-        destination = ROUTES[self.current_route][self.current_destination]
-        self.deliver_next_cargo()
-        play_static_audio('StormAtSea.ogg')
-        harbor_file = 'MakeHarbors%s.ogg' % (destination)
-        play_static_audio(harbor_file)
-        self.mapping[destination][0].when_pressed = self.next_destination
-        sleep(0.5)
-        self.mapping[destination][1].on()
-        self.route_status[self.current_destination] = 'InProgress'
-
-    def deliver_cargo(self):
-        destination = ROUTES[self.current_route][self.current_destination]
-        play_static_audio('SeasHaveCalmed.ogg')
-        deliver_file = 'Deliver%s.ogg' % (destination)
-        play_static_audio(deliver_file)
-        self.mapping[destination][0].when_pressed = self.next_destination
-        sleep(0.5)
-        self.mapping[destination][1].on()
-        self.route_status[self.current_destination] = 'InProgress'
-
-    def deliver_next_cargo(self):
-        destination = ROUTES[self.current_route][self.current_destination + 1]
-        deliver_file = 'Deliver%s.ogg' % (destination)
-        play_static_audio(deliver_file)
-        self.mapping[destination][1].on()
-        sleep(3)
-        self.mapping[destination][0].when_pressed = None
-        self.mapping[destination][1].off()
-
-    def check_game_status(self):
-        if self.current_destination < 3 and self.route_status[self.current_destination] == 'Uninitiated':
-            route_state = self.route_status[self.current_destination]
-            if self.current_destination == 0 and route_state != 'InProgress':
-                self.pickup_cargo()
-            if self.current_destination == 1 and route_state != 'InProgress':
-                self.safe_harbor()
-            if self.current_destination == 2 and route_state != 'InProgress':
-                self.deliver_cargo()
+        self.mapping = dict((destination, [self.buttons[destination], self.leds[destination]])
+                            for destination in self.buttons)
+        # every press goes to the game thread, which decides if it counts
+        for (destination, (button, led)) in self.mapping.items():
+            button.when_pressed = self.loop.poster('pressed', destination)
+
+    def later(self, delay, callback):
+        '''Call back on the game thread after delay, unless the game ends first'''
+        self.timers.append(self.loop.call_later(delay, callback))
+
+    def arrived(self, destination):
+        route = self.routes[self.current_route]
+        # presses during the introduction or a stage's narration don't count
+        if self.armed and not self.over and route[self.current_destination].port == destination:
+            self.mapping[destination][1].off()
+            if self.hint_timer is not None:
+                # the hint is the next stop, whose LED must stay lit now
+                self.hint_timer.cancel()
+                self.hint_timer = None
+            self.current_destination += 1
+            if self.current_destination == len(route):
+                self.win_game()
+            else:
+                self.begin_stage()
+
+    def begin_stage(self):
+        stage = self.routes[self.current_route][self.current_destination]
+        self.armed = False
+        # the first clip drops anything still queued from the last stage
+        for (n, clip) in enumerate(stage.clips):
+            narrated = self.audio.play(clip, interrupt=(n == 0))
+        stop = self.current_destination
+        narrated.add_done_callback(lambda f: self.loop.post('armed', stop))
+        if stage.hint is not None:
+            # light the stop after this one as a decoy while the first clip plays
+            self.mapping[stage.hint][1].on()
+            self.later(self.audio.clips[stage.clips[0]].duration + stage.hint_time,
+                       self.mapping[stage.hint][1].off)
+            self.hint_timer = self.timers[-1]
+
+    def arm_stage(self, stop):
+        '''The stage's narration is over: count presses and light the stop'''
+        if self.over or stop != self.current_destination:
+            return
+        self.armed = True
+        stage = self.routes[self.current_route][stop]
+        self.later(0.5, self.mapping[stage.port][1].on)
 
     def lose_game(self):
-        play_static_audio('PirateLost.ogg')
-        self.cleanup_hardware()
-        send_signal('RESET')
+        self.end_game('PirateLost.ogg', 'RESET', 0)
 
     def win_game(self):
-        play_static_audio('PirateWon.ogg')
+        self.end_game('PirateWon.ogg', 'CARTDONE', 2)
+
+    def end_game(self, clip, message, delay):
+        self.over = True
+        if self.timeout is not None:
+            self.timeout.cancel()
+        for timer in self.timers:
+            timer.cancel()
+        finished = self.audio.play(clip, interrupt=True)
+        finished.add_done_callback(lambda f: self.loop.post('finished', message, delay))
+
+    def finish(self, message, delay):
         self.cleanup_hardware()
-        sleep(2)
-        send_signal('CARTDONE')
+        self.loop.call_later(delay, self.send_and_stop, message)
+
+    def send_and_stop(self, message):
+        self.communications.send(message)
+        self.loop.stop()
+
+    def start_clock(self):
+        self.start_time = self.loop.clock.now()
+        self.timeout = self.loop.call_later(TIMEOUT, self.lose_game)
+        self.begin_stage()
 
     def begin_game(self):
-        read_introduction()
-        self.start_time = time.time()
-        while True:
-            if time.time() - self.start_time > TIMEOUT:
-                self.lose_game()
-                break
-            if self.current_destination == 3:
-                self.win_game()
-                break
-            self.check_game_status()
+        intro = self.audio.play('YouAreTheCaptain.ogg')
+        intro.add_done_callback(lambda f: self.loop.post('start'))
+        self.loop.run()
 
 def main():
     wof = comms.Comms()
-    wof.begin('cartography')
+    wof.begin('cartography', reliable=True)
+    audio = load_audio()
+    routes = load_routes(ROUTES_FILE, LED_MAPPING, HALL_MAPPING, audio.clips)
     if len(sys.argv) > 1 and sys.argv[1] == '-l':
         while True:
-            chase = XyChase()
+            chase = XyChase(wof, audio, routes)
             chase.begin_game()
             sleep(5)
     else:
+        complete = wof.subscribe('COMPLETE', origin='zoltar')
         while True:
-            if wof.available():
-                (origin, message) = wof.recv()
-                if message == 'COMPLETE' and origin == 'zoltar':
-                    chase = XyChase()
-                    chase.begin_game()
+            complete.recv(timeout=None)
+            chase = XyChase(wof, audio, routes)
+            chase.begin_game()
 
 if __name__=="__main__":
    main()
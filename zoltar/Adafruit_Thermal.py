@@ -38,6 +38,16 @@ from serial import Serial
 import time
 import sys
 
+try:
+	from time import monotonic
+except ImportError: # Python 2.X has no monotonic clock
+	from time import time as monotonic
+
+try:
+	import numpy # Optional, speeds up printImage()
+except ImportError:
+	numpy = None
+
 class Adafruit_Thermal(Serial):
 
 	resumeTime      =   0.0
@@ -54,6 +64,10 @@ class Adafruit_Thermal(Serial):
 	defaultHeatTime =   120
 	firmwareVersion =   268
 	writeToStdout   = False
+	spinMargin      = 0.0005 # Busy-wait only this last bit of a timeout
+	encoding        = 'cp437' # Matches the printer's default code page
+	sleepTime       =   0.0
+	spinTime        =   0.0
 
 	def __init__(self, *args, **kwargs):
 		# NEW BEHAVIOR: if no parameters given, output is written
@@ -153,12 +167,35 @@ class Adafruit_Thermal(Serial):
 
 	# Sets estimated completion time for a just-issued task.
 	def timeoutSet(self, x):
-		self.resumeTime = time.time() + x
+		self.resumeTime = monotonic() + x
 
-	# Waits (if necessary) for the prior task to complete.
+	# Waits (if necessary) for the prior task to complete.  Most of
+	# the interval is slept away so the CPU is free for other work;
+	# only the final spinMargin seconds are busy-waited, since
+	# sleep() can overshoot by more than that on a loaded Pi.
 	def timeoutWait(self):
 		if self.writeToStdout is False:
-			while (time.time() - self.resumeTime) < 0: pass
+			start     = monotonic()
+			remaining = self.resumeTime - start
+			if remaining <= 0: return
+			if remaining > self.spinMargin:
+				time.sleep(remaining - self.spinMargin)
+				now = monotonic()
+				self.sleepTime += now - start
+				start = now
+			while monotonic() < self.resumeTime: pass
+			self.spinTime += monotonic() - start
+
+	# Clear the time spent in timeoutWait(), e.g. at the start of
+	# a print job.
+	def resetWaitStats(self):
+		self.sleepTime = 0.0
+		self.spinTime  = 0.0
+
+	# Returns (seconds slept, seconds busy-waited) in timeoutWait()
+	# since the last resetWaitStats().
+	def waitStats(self):
+		return (self.sleepTime, self.spinTime)
 
 	# Printer performance may vary based on the power supply voltage,
 	# thickness of paper, phase of the moon and other seemingly random
@@ -177,7 +214,8 @@ class Adafruit_Thermal(Serial):
 		self.dotPrintTime = p / 1000000.0
 		self.dotFeedTime  = f / 1000000.0
 
-	# 'Raw' byte-writing method
+	# 'Raw' byte-writing method.  All bytes go out in a single
+	# Serial.write() call.
 	def writeBytes(self, *args):
 		if self.writeToStdout:
 			for arg in args:
@@ -185,42 +223,79 @@ class Adafruit_Thermal(Serial):
 		else:
 			self.timeoutWait()
 			self.timeoutSet(len(args) * self.byteTime)
-			for arg in args:
-				super(Adafruit_Thermal, self).write(chr(arg))
-
-	# Override write() method to keep track of paper feed.
+			super(Adafruit_Thermal, self).write(bytes(bytearray(args)))
+
+	# Override write() method to keep track of paper feed.  Rather
+	# than issuing (and waiting for) one byte at a time, text is
+	# sent a printed line at a time: the line is encoded once,
+	# written with one Serial.write() call, and the timeout is set
+	# to the combined time of its bytes plus the paper feed.  A
+	# line never exceeds maxColumn + 1 bytes, which keeps each write
+	# well within the printer's input buffer.
 	def write(self, *data):
-		for i in range(len(data)):
-			c = data[i]
-			if self.writeToStdout:
-				sys.stdout.write(c)
-				continue
-			if c != 0x13:
-				self.timeoutWait()
-				super(Adafruit_Thermal, self).write(c)
-				d = self.byteTime
-				if ((c == '\n') or
-				    (self.column == self.maxColumn)):
-					# Newline or wrap
-					if self.prevByte == '\n':
-						# Feed line (blank)
-						d += ((self.charHeight +
-						       self.lineSpacing) *
-						      self.dotFeedTime)
-					else:
-						# Text line
-						d += ((self.charHeight *
-						       self.dotPrintTime) +
-						      (self.lineSpacing *
-						       self.dotFeedTime))
-						self.column = 0
-						# Treat wrap as newline
-						# on next pass
-						c = '\n'
+		text = ''.join(data)
+		if self.writeToStdout:
+			sys.stdout.write(text)
+			return
+
+		start = 0
+		d     = 0.0
+		for i in range(len(text)):
+			c = text[i]
+			d += self.byteTime
+			if ((c == '\n') or
+			    (self.column == self.maxColumn)):
+				# Newline or wrap
+				if self.prevByte == '\n':
+					# Feed line (blank)
+					d += ((self.charHeight +
+					       self.lineSpacing) *
+					      self.dotFeedTime)
 				else:
-					self.column += 1
+					# Text line
+					d += ((self.charHeight *
+					       self.dotPrintTime) +
+					      (self.lineSpacing *
+					       self.dotFeedTime))
+					self.column = 0
+					# Treat wrap as newline
+					# on next pass
+					c = '\n'
+				self.writeChunk(text[start:i + 1], d)
+				start = i + 1
+				d     = 0.0
+			else:
+				self.column += 1
+			self.prevByte = c
+
+		if start < len(text):
+			self.writeChunk(text[start:], d)
+
+	# Wait for the printer, send one block of text and set the
+	# time it will take to process.
+	def writeChunk(self, text, d):
+		self.timeoutWait()
+		super(Adafruit_Thermal, self).write(
+		  text.encode(self.encoding, 'replace'))
+		self.timeoutSet(d)
+
+	# Send prerendered printer bytes (e.g. from fortune_cache) the
+	# way they were rendered: chunks is a list of (length, print
+	# time) and each chunk is one write, made once the printer has
+	# worked through the one before, just as writeChunk() does, so
+	# the printer's input buffer is never overrun.
+	def writeReceipt(self, data, chunks):
+		if self.writeToStdout:
+			getattr(sys.stdout, 'buffer', sys.stdout).write(data)
+		else:
+			start = 0
+			for (length, d) in chunks:
+				self.timeoutWait()
+				super(Adafruit_Thermal, self).write(data[start:start + length])
 				self.timeoutSet(d)
-				self.prevByte = c
+				start += length
+		self.prevByte = '\n'
+		self.column   = 0
 
 	# The bulk of this method was moved into __init__,
 	# but this is left here for compatibility with older
@@ -345,16 +420,16 @@ class Adafruit_Thermal(Serial):
 				for i in range(n):
 					sys.stdout.write(text[i])
 			else:
-				super(Adafruit_Thermal, self).write(chr(n))
-				for i in range(n):
-					super(Adafruit_Thermal,
-					  self).write(text[i])
+				super(Adafruit_Thermal, self).write(
+				  bytes(bytearray([n])) +
+				  text[:n].encode(self.encoding, 'replace'))
 		else:
 			# Older firmware: write string + NUL
 			if self.writeToStdout:
 				sys.stdout.write(text)
 			else:
-				super(Adafruit_Thermal, self).write(text)
+				super(Adafruit_Thermal, self).write(
+				  text.encode(self.encoding, 'replace'))
 		self.prevByte = '\n'
 
 	# === Character commands ===
@@ -504,7 +579,7 @@ class Adafruit_Thermal(Serial):
 		self.writeBytes(27, 45, 0)
 
 	def printBitmap(self, w, h, bitmap, LaaT=False):
-		rowBytes = (w + 7) / 8  # Round up to next byte boundary
+		rowBytes = (w + 7) // 8  # Round up to next byte boundary
 		if rowBytes >= 48:
 			rowBytesClipped = 48  # 384 pixels max width
 		else:
@@ -519,6 +594,17 @@ class Adafruit_Thermal(Serial):
 		if LaaT: maxChunkHeight = 1
 		else:    maxChunkHeight = 255
 
+		if self.writeToStdout:
+			out = getattr(sys.stdout, 'buffer', sys.stdout)
+		else:
+			out = super(Adafruit_Thermal, self)
+
+		# Chunks are sliced out of the bitmap as whole byte
+		# strings rather than written a byte at a time.
+		if not isinstance(bitmap, (bytes, bytearray)):
+			bitmap = bytearray(bitmap)
+		view = memoryview(bitmap)
+
 		i = 0
 		for rowStart in range(0, h, maxChunkHeight):
 			chunkHeight = h - rowStart
@@ -528,16 +614,14 @@ class Adafruit_Thermal(Serial):
 			# Timeout wait happens here
 			self.writeBytes(18, 42, chunkHeight, rowBytesClipped)
 
-			for y in range(chunkHeight):
-				for x in range(rowBytesClipped):
-					if self.writeToStdout:
-						sys.stdout.write(
-						  chr(bitmap[i]))
-					else:
-						super(Adafruit_Thermal,
-						  self).write(chr(bitmap[i]))
-					i += 1
-				i += rowBytes - rowBytesClipped
+			end = i + chunkHeight * rowBytes
+			if rowBytesClipped == rowBytes:
+				out.write(view[i:end].tobytes())
+			else:
+				out.write(b''.join(
+				  view[n:n + rowBytesClipped].tobytes()
+				  for n in range(i, end, rowBytes)))
+			i = end
 			self.timeoutSet(chunkHeight * self.dotPrintTime)
 
 		self.prevByte = '\n'
@@ -550,33 +634,7 @@ class Adafruit_Thermal(Serial):
 	# the Imaging Library to perform such operations before
 	# passing the result to this function.
 	def printImage(self, image, LaaT=False):
-		from PIL import Image
-
-		if image.mode != '1':
-			image = image.convert('1')
-
-		width  = image.size[0]
-		height = image.size[1]
-		if width > 384:
-			width = 384
-		rowBytes = (width + 7) / 8
-		bitmap   = bytearray(rowBytes * height)
-		pixels   = image.load()
-
-		for y in range(height):
-			n = y * rowBytes
-			x = 0
-			for b in range(rowBytes):
-				sum = 0
-				bit = 128
-				while bit > 0:
-					if x >= width: break
-					if pixels[x, y] == 0:
-						sum |= bit
-					x    += 1
-					bit >>= 1
-				bitmap[n + b] = sum
-
+		(width, height, bitmap) = imageBitmap(image)
 		self.printBitmap(width, height, bitmap, LaaT)
 
 	# Take the printer offline. Print commands sent after this
@@ -734,3 +792,45 @@ class Adafruit_Thermal(Serial):
 			self.write(str(arg))
 		self.write('\n')
 
+
+# Convert a PIL image to the printer's 1-bit bitmap format: rows of
+# (width + 7) // 8 bytes, most significant bit leftmost, 1 = black.
+# Returns (width, height, bitmap).  Images wider than 384 pixels are
+# cropped.  With NumPy installed the whole image is packed in one
+# numpy.packbits() call; otherwise (or with useNumpy=False) pixels
+# are packed one at a time in Python.
+def imageBitmap(image, useNumpy=True):
+	if image.mode != '1':
+		image = image.convert('1')
+
+	width  = image.size[0]
+	height = image.size[1]
+	if width > 384:
+		width = 384
+		image = image.crop((0, 0, width, height))
+
+	if numpy is not None and useNumpy:
+		# Mode '1' arrays are True for white pixels
+		pixels = numpy.asarray(image)
+		return (width, height, bytearray(
+		  numpy.packbits(~pixels, axis=1).tobytes()))
+
+	rowBytes = (width + 7) // 8
+	bitmap   = bytearray(rowBytes * height)
+	pixels   = image.load()
+
+	for y in range(height):
+		n = y * rowBytes
+		x = 0
+		for b in range(rowBytes):
+			sum = 0
+			bit = 128
+			while bit > 0:
+				if x >= width: break
+				if pixels[x, y] == 0:
+					sum |= bit
+				x    += 1
+				bit >>= 1
+			bitmap[n + b] = sum
+
+	return (width, height, bitmap)
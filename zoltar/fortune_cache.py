@@ -0,0 +1,217 @@
+'''
+Prerendered fortune receipts
+
+Every fortune in fortunes.txt is rendered once into the exact byte
+stream Adafruit_Thermal would send for it (feeds, justification,
+size, bold and the wrapped text), split into the chunks it would have
+written one at a time, each with the time the printer needs to work
+through it.  The receipts are stored in one cache file:
+
+    header   MAGIC, VERSION, sha256 key, fortune count
+    index    count x (offset, length, weight, chunk count)
+    data     each receipt's bytes followed by its chunk table,
+             chunk count x (length, print time in microseconds)
+
+Blank lines are skipped, and a line may start with a weight and a tab
+("3<tab>You will find a coin") for fortune_deck.py to draw it more often.
+The key is a hash of fortunes.txt and RECEIPT_SETTINGS, so editing
+either rebuilds the cache on next load.  The file is mmap'd and each
+receipt is found by its fixed-size index entry, so printing a fortune
+is one lookup plus a paced write per chunk:
+
+    cache = FortuneCache('fortunes.txt')
+    (data, chunks) = cache.receipt(random.randrange(len(cache)))
+    printer.writeReceipt(data, chunks)
+'''
+
+import hashlib
+import mmap
+import os
+import struct
+from serial import Serial
+from Adafruit_Thermal import Adafruit_Thermal
+from wordwrap import columns, wrap
+
+MAGIC   = b'WOFC'
+VERSION = 4
+HEADER  = struct.Struct('<4sH32sI')
+INDEX   = struct.Struct('<IIfI')
+CHUNK   = struct.Struct('<HI')
+
+# how a fortune receipt is laid out, part of the cache key
+RECEIPT_SETTINGS = {
+    'prefix': 'Zoltar says: ',
+    'width': 28,            # max number of characters allowed per line
+    'balanced': False,      # even out line lengths instead of filling greedily
+    'justify': 'C',
+    'size': 'M',
+    'bold': True,
+    'feed_before': 1,       # whitespace at the top of the print
+    'feed_after': 5,        # whitespace at the bottom of the print
+    'baudrate': 19200,
+    'firmware': 268,
+}
+
+
+class _Capture(Serial):
+    def write(self, data):
+        self.captured += data
+        return len(data)
+
+
+class ReceiptRenderer(Adafruit_Thermal, _Capture):
+    '''An Adafruit_Thermal that records bytes and print time instead of sending them
+
+    Adafruit_Thermal waits out the printer before every write, so each
+    write becomes its own chunk, to be sent the same way later.'''
+
+    def __init__(self, settings=RECEIPT_SETTINGS):
+        # deliberately skips Serial/Adafruit_Thermal __init__: no port
+        self.firmwareVersion = settings['firmware']
+        self.byteTime = 11.0 / float(settings['baudrate'])
+        self.dotPrintTime = 0.03
+        self.dotFeedTime = 0.0021
+        self.start_capture()
+        self.reset()
+        self.start_capture()
+
+    def start_capture(self):
+        self.captured = bytearray()
+        self.chunks = []
+        self.chunk_start = 0
+        self.duration = 0.0
+
+    def end_chunk(self):
+        length = len(self.captured) - self.chunk_start
+        if length:
+            self.chunks.append((length, self.duration))
+            self.chunk_start = len(self.captured)
+            self.duration = 0.0
+
+    def timeoutSet(self, x):
+        self.duration += x
+
+    def timeoutWait(self):
+        self.end_chunk()
+
+    def render(self, lines, settings=RECEIPT_SETTINGS):
+        '''Return (bytes, [(chunk length, print time in seconds), ...]) for lines'''
+        self.start_capture()
+
+        self.feed(settings['feed_before'])
+        self.justify(settings['justify'])
+        self.setSize(settings['size'])
+        if settings['bold']:
+            self.boldOn()
+        for line in lines:
+            self.println(line)
+        if settings['bold']:
+            self.boldOff()
+        self.feed(settings['feed_after'])
+        self.end_chunk()
+
+        return (bytes(self.captured), self.chunks)
+
+
+def cache_key(fortunes_path, settings):
+    digest = hashlib.sha256()
+    with open(fortunes_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    digest.update(repr(sorted(settings.items())).encode())
+    return digest.digest()
+
+
+def parse_fortune(line):
+    '''Split a fortunes.txt line into (weight, text); "3<tab>text" weighs 3, plain text 1'''
+    (weight, tab, text) = line.partition('\t')
+    if tab:
+        try:
+            return (max(float(weight), 0.0), text.strip())
+        except ValueError:
+            pass
+    return (1.0, line.strip())
+
+
+def read_fortunes(fortunes_path):
+    with open(fortunes_path, encoding='utf-8') as f:
+        for line in f:
+            (weight, text) = parse_fortune(line)
+            if text:
+                yield (weight, text)
+
+
+def build(fortunes_path, cache_path, settings=RECEIPT_SETTINGS):
+    # one pass to count, one to render, so the fortunes themselves
+    # never all sit in memory at once
+    count = sum(1 for fortune in read_fortunes(fortunes_path))
+
+    renderer = ReceiptRenderer(settings)
+    width = min(settings['width'], columns(settings['size']))
+    offset = HEADER.size + INDEX.size * count
+    index = bytearray()
+
+    tmp_path = cache_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.seek(offset)
+        for (weight, fortune) in read_fortunes(fortunes_path):
+            lines = wrap(settings['prefix'] + fortune, width, settings['balanced'])
+            (data, chunks) = renderer.render(lines, settings)
+            f.write(data)
+            for (length, duration) in chunks:
+                f.write(CHUNK.pack(length, int(duration * 1000000)))
+            index += INDEX.pack(offset, len(data), weight, len(chunks))
+            offset += len(data) + CHUNK.size * len(chunks)
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, cache_key(fortunes_path, settings), count))
+        f.write(index)
+    os.replace(tmp_path, cache_path)
+
+
+class FortuneCache(object):
+    def __init__(self, fortunes_path, cache_path=None, settings=RECEIPT_SETTINGS):
+        self.fortunes_path = fortunes_path
+        self.cache_path = cache_path or os.path.splitext(fortunes_path)[0] + '.cache'
+        self.settings = settings
+        self.map = None
+        self.load()
+
+    def load(self):
+        '''Map the cache file, rebuilding it first if fortunes.txt or the settings changed'''
+        key = cache_key(self.fortunes_path, self.settings)
+        if not self.valid(key):
+            build(self.fortunes_path, self.cache_path, self.settings)
+
+        self.close()
+        with open(self.cache_path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.key, self.count) = HEADER.unpack_from(self.map)
+
+    def valid(self, key):
+        try:
+            with open(self.cache_path, 'rb') as f:
+                header = f.read(HEADER.size)
+            (magic, version, cached_key, count) = HEADER.unpack(header)
+        except (IOError, OSError, struct.error):
+            return False
+        return magic == MAGIC and version == VERSION and cached_key == key
+
+    def __len__(self):
+        return self.count
+
+    def receipt(self, n):
+        '''Return (bytes, [(chunk length, print time in seconds), ...]) for fortune number n'''
+        (offset, length, weight, count) = INDEX.unpack_from(self.map, HEADER.size + n * INDEX.size)
+        table = self.map[offset + length:offset + length + count * CHUNK.size]
+        chunks = [(size, micros / 1000000.0) for (size, micros) in CHUNK.iter_unpack(table)]
+        return (self.map[offset:offset + length], chunks)
+
+    def weights(self):
+        '''The weight of every fortune, in order'''
+        return [entry[2] for entry in INDEX.iter_unpack(self.map[HEADER.size:HEADER.size + self.count * INDEX.size])]
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
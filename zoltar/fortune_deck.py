@@ -0,0 +1,168 @@
+'''
+Choosing which fortune to print
+
+FortuneDeck picks fortunes out of a FortuneCache in one of two ways:
+
+    bag       every fortune comes up once (or weight times, rounded)
+              before any comes up again, in a fresh random order each
+              pass, and never the same one twice in a row across passes
+    weighted  independent draws in proportion to each fortune's weight,
+              in constant time per draw (Vose's alias method)
+
+The bag is shuffled lazily, one Fisher-Yates step per draw, and lives
+in a small state file next to the cache that is mmap'd and updated in
+place, so a restart carries on through the same pass.  The state is
+thrown away and a new pass started whenever the cache is rebuilt.
+
+    deck = FortuneDeck(FortuneCache('fortunes.txt'))
+    (data, chunks) = deck.draw()
+'''
+
+import mmap
+import os
+import random
+import struct
+
+MAGIC   = b'WOFD'
+VERSION = 1
+HEADER  = struct.Struct('<4sH32sIII')   # magic, version, cache key, size, position, last
+ENTRY   = struct.Struct('<I')
+NO_LAST = 0xFFFFFFFF
+
+
+class AliasTable(object):
+    '''Draw index i with probability weights[i] / sum(weights) in O(1)'''
+
+    def __init__(self, weights):
+        count = len(weights)
+        total = float(sum(weights))
+        if count == 0 or total <= 0:
+            raise ValueError('need at least one positive weight')
+
+        self.prob = [1.0] * count
+        self.alias = list(range(count))
+        scaled = [w * count / total for w in weights]
+        small = [i for i in range(count) if scaled[i] < 1.0]
+        large = [i for i in range(count) if scaled[i] >= 1.0]
+
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+        # whatever is left is 1.0 give or take rounding error
+
+    def draw(self, rng=random):
+        i = rng.randrange(len(self.prob))
+        if rng.random() < self.prob[i]:
+            return i
+        return self.alias[i]
+
+
+def bag_entries(weights):
+    '''Fortune numbers for one pass of the bag, each repeated by its rounded weight'''
+    entries = []
+    for (n, weight) in enumerate(weights):
+        entries.extend([n] * int(round(weight)))
+    if not entries:
+        entries = list(range(len(weights)))
+    return entries
+
+
+class FortuneDeck(object):
+    def __init__(self, cache, state_path=None, mode='bag', rng=None):
+        if mode not in ('bag', 'weighted'):
+            raise ValueError('mode must be bag or weighted')
+        if not len(cache):
+            raise ValueError('no fortunes in {0}'.format(cache.fortunes_path))
+        self.cache = cache
+        self.state_path = state_path or os.path.splitext(cache.cache_path)[0] + '.deck'
+        self.mode = mode
+        self.rng = rng or random.Random()
+        self.map = None
+        self.table = None
+
+        if mode == 'weighted':
+            self.table = AliasTable(cache.weights())
+        else:
+            self.load()
+
+    def load(self):
+        '''Map the bag state, starting a new bag if there is none for this cache'''
+        if not self.valid():
+            entries = bag_entries(self.cache.weights())
+            tmp_path = self.state_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, VERSION, self.cache.key, len(entries), 0, NO_LAST))
+                f.write(struct.pack('<%dI' % len(entries), *entries))
+            os.replace(tmp_path, self.state_path)
+
+        self.close()
+        with open(self.state_path, 'r+b') as f:
+            self.map = mmap.mmap(f.fileno(), 0)
+        self.size = HEADER.unpack_from(self.map)[3]
+
+    def valid(self):
+        try:
+            with open(self.state_path, 'rb') as f:
+                header = f.read(HEADER.size)
+                (magic, version, key, size, position, last) = HEADER.unpack(header)
+                f.seek(0, os.SEEK_END)
+                length = f.tell()
+        except (IOError, OSError, struct.error):
+            return False
+        return (magic == MAGIC and version == VERSION and key == self.cache.key and
+                length == HEADER.size + size * ENTRY.size and position <= size)
+
+    def entry(self, i):
+        return ENTRY.unpack_from(self.map, HEADER.size + i * ENTRY.size)[0]
+
+    def swap(self, i, j):
+        a = self.entry(i)
+        ENTRY.pack_into(self.map, HEADER.size + i * ENTRY.size, self.entry(j))
+        ENTRY.pack_into(self.map, HEADER.size + j * ENTRY.size, a)
+
+    def next_fortune(self):
+        '''Number of the fortune to print next'''
+        if self.table is not None:
+            return self.table.draw(self.rng)
+
+        (magic, version, key, size, position, last) = HEADER.unpack_from(self.map)
+        if position >= size:
+            position = 0
+
+        # one step of Fisher-Yates: pick from what is left of this pass
+        j = self.rng.randrange(position, size)
+        if position == 0:
+            # don't open a new pass with the fortune that closed the last
+            for attempt in range(8):
+                if self.entry(j) != last:
+                    break
+                j = self.rng.randrange(position, size)
+        self.swap(position, j)
+        fortune = self.entry(position)
+
+        HEADER.pack_into(self.map, 0, magic, version, key, size, position + 1, fortune)
+        self.map.flush()
+        return fortune
+
+    def draw(self):
+        '''(bytes, chunks) of the next fortune's receipt, as FortuneCache.receipt()'''
+        return self.cache.receipt(self.next_fortune())
+
+    def remaining(self):
+        '''Draws left before the bag starts a new pass'''
+        if self.table is not None:
+            return None
+        (magic, version, key, size, position, last) = HEADER.unpack_from(self.map)
+        return size - position
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
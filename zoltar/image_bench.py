@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# Benchmark printImage() bitmap packing on synthetic images of
+# several sizes, comparing the NumPy path with the pure-Python
+# fallback, then time sending each bitmap over a pty-backed fake
+# serial port (print/feed times zeroed, so only the host side counts).
+#
+#   python3 image_bench.py
+
+import os
+import pty
+import random
+import threading
+import time
+from PIL import Image
+import Adafruit_Thermal
+from printer_bench import BenchPrinter, drain
+
+SIZES = [(128, 128), (384, 200), (384, 800), (576, 1200)]
+
+
+def synthetic_image(width, height):
+    rng = random.Random(width * height)
+    image = Image.new('L', (width, height))
+    image.putdata([(x * 255 // width + rng.randint(-64, 64)) % 256
+                   for y in range(height) for x in range(width)])
+    return image
+
+
+def timed(func, *args):
+    start = time.time()
+    result = func(*args)
+    return (time.time() - start, result)
+
+
+if __name__ == '__main__':
+    master, slave = pty.openpty()
+    threading.Thread(target=drain, args=(master,), daemon=True).start()
+    printer = BenchPrinter(os.ttyname(slave), 19200, timeout=5)
+    printer.setTimes(0, 0)
+
+    print('%-10s %10s %10s %8s %10s %7s' % ('size', 'python', 'numpy', 'speedup', 'send', 'writes'))
+    for (width, height) in SIZES:
+        image = synthetic_image(width, height).convert('1')
+
+        (slow, expected) = timed(Adafruit_Thermal.imageBitmap, image, False)
+        (fast, packed) = timed(Adafruit_Thermal.imageBitmap, image, True)
+        assert packed == expected, 'NumPy and Python bitmaps differ'
+
+        printer.writes = 0
+        (send, result) = timed(printer.printBitmap, *packed)
+
+        print('%-10s %9.1fms %9.1fms %7.0fx %9.1fms %7d' % (
+            '%dx%d' % (width, height), slow * 1000, fast * 1000,
+            slow / max(fast, 1e-9), send * 1000, printer.writes))
+
+    printer.close()
+    os.close(master)
@@ -0,0 +1,101 @@
+'''
+Zoltar's servo motion
+
+The sweep is worked out once as a list of (seconds into the cycle,
+angle) points, eased in and out with a cosine so the arm slows into
+each end instead of slamming, with a hold at the bottom.  A
+MotionEngine plays it on its own thread, writing each angle when its
+time comes and sleeping on an Event in between, so stop() (from a
+button callback or a bus message) halts the arm at once rather than
+at the end of a sweep.
+
+    path = trajectory(0, 179)
+    motion = MotionEngine(servo, path)
+    motion.start()
+    ...
+    motion.stop('coin')         # from any thread
+    motion.wait()
+    print(motion.latency)       # stop() to the arm standing still
+'''
+
+import math
+import threading
+import time
+
+TICK        = 0.02      # seconds between angle updates
+SWEEP_TIME  = 1.8       # seconds for each sweep, about what the old 179 x 0.01s steps took
+HOLD_TIME   = 0.5       # seconds to rest at the bottom of each cycle
+
+
+def eased(start, end, duration, tick, offset):
+    points = []
+    steps = max(int(round(duration / tick)), 1)
+    for n in range(1, steps + 1):
+        progress = (1 - math.cos(math.pi * n / steps)) / 2
+        points.append((offset + duration * n / steps, start + (end - start) * progress))
+    return points
+
+
+def trajectory(min_angle, max_angle, sweep_time=SWEEP_TIME, hold_time=HOLD_TIME, tick=TICK):
+    '''One cycle from max_angle down to min_angle, a hold, and back up'''
+    points = [(0.0, float(max_angle))]
+    points += eased(max_angle, min_angle, sweep_time, tick, 0.0)
+    points += eased(min_angle, max_angle, sweep_time, tick, sweep_time + hold_time)
+    return points
+
+
+class MotionEngine(object):
+    def __init__(self, servo, path):
+        self.servo = servo
+        self.path = path
+        self.cycle = path[-1][0]
+        self.stopping = threading.Event()
+        self.stopped = threading.Event()
+        self.stopped.set()
+        self.lock = threading.Lock()    # stop() comes from button and bus threads
+        self.reason = None
+        self.requested = None
+        self.latency = None
+        self.thread = None
+
+    def start(self):
+        self.stopping.clear()
+        self.stopped.clear()
+        self.reason = None
+        self.requested = None
+        self.latency = None
+        self.thread = threading.Thread(target=self.run, name='motion', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        started = time.monotonic()
+        try:
+            while True:
+                for (at, angle) in self.path:
+                    remaining = started + at - time.monotonic()
+                    if remaining > 0 and self.stopping.wait(remaining):
+                        return
+                    if self.stopping.is_set():
+                        return
+                    self.servo.angle = angle
+                started += self.cycle
+        finally:
+            if self.requested is not None:
+                self.latency = time.monotonic() - self.requested
+            self.stopped.set()
+
+    def stop(self, reason, when=None):
+        '''Halt the arm; when is the time.monotonic() the trigger happened, if earlier'''
+        with self.lock:
+            if self.stopping.is_set():
+                return
+            self.reason = reason
+            self.requested = when or time.monotonic()
+            self.stopping.set()
+
+    def moving(self):
+        return not self.stopped.is_set()
+
+    def wait(self, timeout=None):
+        '''True once the arm has stopped'''
+        return self.stopped.wait(timeout)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# Benchmark text output to the thermal printer against a pty-backed
+# fake serial port, so it runs without a printer attached.  Prints
+# every fortune in fortunes.txt twice: once a character at a time
+# (how write() used to talk to the port) and once a line at a time,
+# and reports Serial.write() calls, wall time and CPU time for each.
+#
+#   python3 printer_bench.py [--fast] [--count N]
+
+import argparse
+import os
+import pty
+import threading
+import time
+from serial import Serial
+from Adafruit_Thermal import Adafruit_Thermal
+from wordwrap import wrap
+
+
+class _CountWrites(Serial):
+    writes = 0
+    written = 0
+
+    def write(self, data):
+        self.writes += 1
+        self.written += len(data)
+        return Serial.write(self, data)
+
+
+class BenchPrinter(Adafruit_Thermal, _CountWrites):
+    pass
+
+
+def drain(fd):
+    try:
+        while os.read(fd, 4096):
+            pass
+    except OSError:
+        pass
+
+
+def run(printer, lines, per_char):
+    printer.writes = 0
+    printer.written = 0
+    printer.resetWaitStats()
+    wall = time.time()
+    cpu = time.process_time()
+
+    for line in lines:
+        if per_char:
+            for c in line + '\n':
+                printer.write(c)
+        else:
+            printer.println(line)
+    printer.timeoutWait()
+
+    return (printer.writes, printer.written,
+            time.time() - wall, time.process_time() - cpu,
+            printer.waitStats())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-f', '--fast', action='store_true', help='zero print/feed times to time only the serial side')
+    parser.add_argument('-c', '--count', type=int, default=10, help='number of fortunes to print')
+    args = parser.parse_args()
+
+    master, slave = pty.openpty()
+    threading.Thread(target=drain, args=(master,), daemon=True).start()
+
+    printer = BenchPrinter(os.ttyname(slave), 19200, timeout=5)
+    if args.fast:
+        printer.setTimes(0, 0)
+    printer.setSize('M')
+
+    fortunes = open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fortunes.txt')).read().splitlines()
+    lines = []
+    for fortune in fortunes[:args.count]:
+        lines.extend(wrap(fortune, printer.maxColumn))
+
+    for (label, per_char) in (('per-char', True), ('per-line', False)):
+        (writes, written, wall, cpu, waits) = run(printer, lines, per_char)
+        print('%-8s %5d writes %6d bytes  wall %6.2fs  cpu %5.2fs  (slept %.2fs, spun %.3fs)' %
+              (label, writes, written, wall, cpu, waits[0], waits[1]))
+
+    printer.close()
+    os.close(master)
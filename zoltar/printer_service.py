@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+'''
+Long-running fortune printer service
+
+Opens the thermal printer once, keeps it initialized and prints a
+fortune for every job it is sent, so a coin drop no longer pays for
+interpreter start-up, imports, opening the serial port and the
+printer's cold-boot delay.  Jobs arrive on a local Unix datagram
+socket (and, with --bus, as PRINT messages on the wall's Comms bus)
+and wait in a bounded queue; extra jobs are turned away rather than
+piling up behind a jammed printer.
+
+For each job it reports the time from the coin to the first byte
+written and to the (estimated) paper out, and tells a socket client
+still waiting on it (request_print(wait=...)) once the paper is out.
+
+    python3 printer_service.py &
+
+    import printer_service
+    if printer_service.request_print(coin_time) == printer_service.NO_SERVICE:
+        print_another_way()
+'''
+
+import argparse
+import errno
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+from Adafruit_Thermal import Adafruit_Thermal
+from fortune_cache import FortuneCache
+from fortune_deck import FortuneDeck
+
+SOCKET_PATH     = '/tmp/zoltar_printer.sock'
+PRINTER_PORT    = '/dev/serial0'
+PRINTER_BAUD    = 19200
+JOB_QUEUE_SIZE  = 4
+
+# what request_print() says became of a job
+PRINTED         = 'printed'
+QUEUED          = 'queued'
+FULL            = 'queue full'
+NO_REPLY        = 'no reply'
+FAILED          = 'failed'
+NO_SERVICE      = 'no service'
+
+
+def request_print(coin_time = None, path = SOCKET_PATH, wait = 0):
+    '''Ask a running service for a fortune, returning what became of it
+
+    coin_time is the time.monotonic() the coin was detected, used
+    for the service's latency report.  With wait, also wait up to
+    that many seconds for the service to say the fortune is out.
+    Only NO_SERVICE means nothing holds the printer; after FULL,
+    NO_REPLY or FAILED the service still has it open.'''
+    if coin_time is None:
+        coin_time = time.monotonic()
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        sock.bind('')  # autobind, so the service can answer
+        sock.sendto(('PRINT %f' % coin_time).encode(), path)
+        sock.settimeout(1)
+        reply = sock.recv(16)
+        if reply == b'FULL':
+            return FULL
+        if reply == b'DONE':
+            return PRINTED  # printed before the OK went out
+        if not wait:
+            return QUEUED
+        sock.settimeout(wait)
+        while sock.recv(16) != b'DONE':
+            pass
+        return PRINTED
+    except socket.timeout:
+        return NO_REPLY
+    except socket.error as e:
+        if e.errno in (errno.ENOENT, errno.ECONNREFUSED):
+            return NO_SERVICE
+        return FAILED
+    finally:
+        sock.close()
+
+
+class PrinterService(object):
+    def __init__(self, printer, deck, queue_size = JOB_QUEUE_SIZE):
+        self.printer = printer
+        self.deck = deck
+        self.jobs = queue.Queue(queue_size)
+        self.sock = None
+        self.printed = 0
+        self.rejected = 0
+
+    def submit(self, coin_time, source, reply_to = None):
+        try:
+            self.jobs.put_nowait((coin_time, source, reply_to))
+            return True
+        except queue.Full:
+            self.rejected += 1
+            print('Print queue full, dropping job from {0}'.format(source))
+            return False
+
+    def print_job(self, coin_time, source):
+        (receipt, chunks) = self.deck.draw()
+
+        self.printer.timeoutWait()
+        first_byte = time.monotonic()
+        self.printer.writeReceipt(receipt, chunks)
+        self.printer.timeoutWait()
+        paper_out = time.monotonic()
+        self.printer.setDefault()
+
+        self.printed += 1
+        if coin_time is None:
+            print('Printed fortune for {0}: {1:.2f}s on paper'.format(source, paper_out - first_byte))
+        else:
+            print('Printed fortune for {0}: first byte {1:.3f}s, paper out {2:.2f}s after coin'.format(
+                source, first_byte - coin_time, paper_out - coin_time))
+
+    def worker(self):
+        while True:
+            (coin_time, source, reply_to) = self.jobs.get()
+            try:
+                self.print_job(coin_time, source)
+            except Exception as e:
+                print('Print job failed: {0}'.format(e))
+            if reply_to:
+                try:
+                    self.sock.sendto(b'DONE', reply_to)
+                except socket.error:
+                    pass    # nobody waiting any more
+
+    def serve_socket(self, path):
+        if os.path.exists(path):
+            os.unlink(path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(path)
+        self.sock = sock
+
+        while True:
+            (data, addr) = sock.recvfrom(64)
+            fields = data.decode(errors='replace').split()
+            if not fields or fields[0] != 'PRINT':
+                continue
+            coin_time = None
+            if len(fields) > 1:
+                try:
+                    coin_time = float(fields[1])
+                except ValueError:
+                    print('Ignoring malformed job: {0!r}'.format(data))
+                    continue
+            accepted = self.submit(coin_time, 'socket', addr)
+            if addr:
+                sock.sendto(b'OK' if accepted else b'FULL', addr)
+
+    def serve_bus(self, comm_client):
+        prints = comm_client.subscribe('PRINT')
+        while True:
+            (origin, message) = prints.recv(timeout=None)
+            self.submit(None, origin)
+
+
+def run_main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--socket', action='store', default=SOCKET_PATH, help='unix socket to take jobs on')
+    parser.add_argument('-b', '--bus', action='store_true', help='also take PRINT messages from the wall network')
+    parser.add_argument('-d', '--deck', choices=('bag', 'weighted'), default='bag', help='no repeats until every fortune is printed, or weighted draws')
+    parser.add_argument('-q', '--queue', type=int, default=JOB_QUEUE_SIZE, help='most jobs to hold at once')
+    args = parser.parse_args()
+
+    zoltar_dir = os.path.dirname(os.path.abspath(__file__))
+    deck = FortuneDeck(FortuneCache(os.path.join(zoltar_dir, 'fortunes.txt')), mode=args.deck)
+    printer = Adafruit_Thermal(PRINTER_PORT, PRINTER_BAUD, timeout=5)
+    service = PrinterService(printer, deck, args.queue)
+
+    threading.Thread(target=service.worker, daemon=True).start()
+
+    if args.bus:
+        sys.path.append(os.path.dirname(zoltar_dir))
+        from utils import comms
+        wof = comms.Comms()
+        wof.begin('printer')
+        threading.Thread(target=service.serve_bus, args=(wof,), daemon=True).start()
+
+    print('Printer ready, waiting for jobs on {0}'.format(args.socket))
+    try:
+        service.serve_socket(args.socket)
+    except KeyboardInterrupt:
+        os.unlink(args.socket)
+
+
+# Main program logic follows:
+if __name__ == '__main__':
+    run_main()
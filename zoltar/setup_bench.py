@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# Benchmark Zoltar's per-round hardware setup on gpiozero's mock pins,
+# so it runs without a Pi.  "rebuild" is what every round used to do:
+# construct both eye LEDs, the coin button and the servo, then close
+# them all at the end.  "arm" is the persistent controller's round:
+# arm() and disarm() on hardware opened once.
+#
+#   python3 setup_bench.py [--rounds N]
+
+import argparse
+import os
+import sys
+import time
+from gpiozero import AngularServo, Button, Device, LED
+from gpiozero.pins.mock import MockFactory, MockPWMPin
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import zoltar
+
+
+class NoComms(object):
+    class Subscription(object):
+        def available(self):
+            return 0
+
+        def cancel(self):
+            pass
+
+    def subscribe(self, message):
+        return self.Subscription()
+
+
+def rebuild_round(pressed):
+    left_eye = LED(zoltar.LED1_GPIO)
+    right_eye = LED(zoltar.LED2_GPIO)
+    button = Button(zoltar.BUTTON_GPIO)
+    button.when_pressed = pressed
+    servo = AngularServo(zoltar.SERVO_GPIO,
+                         min_angle=zoltar.SERVO_MIN_ANGLE,
+                         max_angle=zoltar.SERVO_MAX_ANGLE,
+                         initial_angle=zoltar.SERVO_INITIAL_ANGLE)
+    left_eye.close()
+    right_eye.close()
+    servo.close()
+    button.close()
+
+
+def timed(func, rounds):
+    times = []
+    for n in range(rounds):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return (times[len(times) // 2], times[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-r', '--rounds', type=int, default=20, help='rounds to time')
+    args = parser.parse_args()
+
+    Device.pin_factory = MockFactory(pin_class=MockPWMPin)
+    rebuild = timed(lambda: rebuild_round(lambda: None), args.rounds)
+
+    start = time.perf_counter()
+    controller = zoltar.Zoltar(NoComms())
+    opened = time.perf_counter() - start
+
+    def arm_round():
+        controller.arm()
+        controller.disarm()
+    armed = timed(arm_round, args.rounds)
+
+    print('%-8s %10s %10s' % ('round', 'median', 'max'))
+    print('%-8s %8.2fms %8.2fms' % ('rebuild', rebuild[0] * 1000, rebuild[1] * 1000))
+    print('%-8s %8.2fms %8.2fms   (plus %.2fms once, opening the hardware)' % (
+        'arm', armed[0] * 1000, armed[1] * 1000, opened * 1000))
@@ -0,0 +1,98 @@
+'''
+Word wrapping for thermal printer receipts
+
+Lines are measured in printer columns: 32 characters for the small
+and medium sizes, 16 for large (double width), matching the
+maxColumn Adafruit_Thermal.setSize() sets.  A line is never longer
+than the width asked for; a word longer than a whole line is broken
+across lines rather than left to the printer's own hard wrap.
+
+    lines = wrap('Zoltar says: ' + fortune, columns('M', margin=4))
+
+wrap() is single-pass greedy (fill each line as far as it goes).
+wrap(..., balanced=True) instead picks the breaks that make the lines
+most even, minimizing the sum of squared gaps on every line but the
+last; it only has to look back one line's worth of words per word, so
+it is still linear in the length of the text.
+'''
+
+# printer columns for each setSize() mode, see Adafruit_Thermal.setSize()
+SIZE_COLUMNS = {
+    'S': 32,
+    'M': 32,
+    'L': 16,
+}
+
+
+def columns(size, margin=0):
+    '''Usable columns for a setSize() mode, less margin'''
+    return SIZE_COLUMNS.get(size.upper(), SIZE_COLUMNS['S']) - margin
+
+
+def split_words(text, width):
+    '''Split on whitespace, breaking any word longer than width into pieces'''
+    words = []
+    for word in text.split():
+        while len(word) > width:
+            words.append(word[:width])
+            word = word[width:]
+        words.append(word)
+    return words
+
+
+def wrap_greedy(words, width):
+    lines = []
+    line = []
+    length = -1
+    for word in words:
+        if line and length + 1 + len(word) > width:
+            lines.append(' '.join(line))
+            line = []
+            length = -1
+        line.append(word)
+        length += 1 + len(word)
+    if line:
+        lines.append(' '.join(line))
+    return lines
+
+
+def wrap_balanced(words, width):
+    count = len(words)
+    if not count:
+        return []
+
+    # best[i] is the least cost of setting words[i:], start[i] the
+    # word the line after words[i]'s line starts with
+    best = [0] * (count + 1)
+    start = [count] * (count + 1)
+    for i in range(count - 1, -1, -1):
+        length = -1
+        best[i] = None
+        for j in range(i, count):
+            length += 1 + len(words[j])
+            if length > width and j > i:
+                break
+            if j == count - 1:
+                cost = 0  # the last line may be as short as it likes
+            else:
+                cost = (width - length) ** 2 + best[j + 1]
+            if best[i] is None or cost < best[i]:
+                best[i] = cost
+                start[i] = j + 1
+
+    lines = []
+    i = 0
+    while i < count:
+        lines.append(' '.join(words[i:start[i]]))
+        i = start[i]
+    return lines
+
+
+def wrap(text, width, balanced=False):
+    '''Wrap text into lines of at most width columns'''
+    if width < 1:
+        raise ValueError('width must be at least one column')
+    words = split_words(text, width)
+    if balanced:
+        return wrap_balanced(words, width)
+    return wrap_greedy(words, width)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# Check and benchmark wordwrap.py.  First wraps a few thousand random
+# texts (random word lengths, runs of whitespace, words longer than a
+# line) at random widths and asserts the properties every wrap must
+# have; then times greedy, balanced and the standard library's
+# textwrap over a large corpus built from fortunes.txt.
+#
+#   python3 wrap_bench.py [--cases N] [--corpus N] [--seed N]
+
+import argparse
+import os
+import random
+import textwrap
+import time
+from wordwrap import SIZE_COLUMNS, split_words, wrap
+
+
+def random_text(rng):
+    words = []
+    for i in range(rng.randint(0, 40)):
+        length = rng.choice([1, 2, 3, 4, 5, 6, 8, 12, rng.randint(1, 40)])
+        words.append(''.join(rng.choice('abcdefghijklmnopqrstuvwxyz.,!?\'') for c in range(length)))
+    return ''.join(word + rng.choice([' ', ' ', '  ', '\t', '\n']) for word in words)
+
+
+def raggedness(lines, width):
+    return sum((width - len(line)) ** 2 for line in lines[:-1])
+
+
+def check(text, width):
+    greedy = wrap(text, width)
+    balanced = wrap(text, width, balanced=True)
+
+    for lines in (greedy, balanced):
+        # nothing past the edge of the paper, no blank or padded lines
+        assert all(0 < len(line) <= width for line in lines), (text, width, lines)
+        assert all(line == line.strip() for line in lines), (text, width, lines)
+        # every word kept, in order, broken only where it would not fit
+        assert ' '.join(lines).split() == split_words(text, width), (text, width, lines)
+
+    # greedy never breaks a line that the next word would have fit on
+    for (line, after) in zip(greedy, greedy[1:]):
+        assert len(line) + 1 + len(after.split()[0]) > width, (text, width, greedy)
+
+    # balanced is never more ragged than greedy
+    assert raggedness(balanced, width) <= raggedness(greedy, width), (text, width)
+
+
+def corpus(fortunes, count, rng):
+    words = ' '.join(fortunes).split()
+    return [' '.join(rng.choice(words) for i in range(rng.randint(4, 60))) for n in range(count)]
+
+
+def timed(func, texts, width):
+    start = time.time()
+    lines = 0
+    for text in texts:
+        lines += len(func(text, width))
+    return (time.time() - start, lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', '--cases', type=int, default=5000, help='number of random texts to check')
+    parser.add_argument('-n', '--corpus', type=int, default=100000, help='number of fortunes to benchmark')
+    parser.add_argument('-s', '--seed', type=int, default=1, help='random seed')
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    for case in range(args.cases):
+        check(random_text(rng), rng.randint(1, 40))
+    for size in SIZE_COLUMNS:
+        check(random_text(rng), SIZE_COLUMNS[size])
+    print('%d random texts wrapped, all properties hold' % args.cases)
+
+    fortunes = open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fortunes.txt')).read().splitlines()
+    texts = corpus(fortunes, args.corpus, rng)
+    chars = sum(len(text) for text in texts)
+
+    print('%-10s %9s %9s %12s' % ('wrap', 'time', 'lines', 'chars/s'))
+    for (label, func) in (('greedy', wrap),
+                          ('balanced', lambda text, width: wrap(text, width, balanced=True)),
+                          ('textwrap', textwrap.wrap)):
+        (elapsed, lines) = timed(func, texts, 28)
+        print('%-10s %8.2fs %9d %12.0f' % (label, elapsed, lines, chars / elapsed))
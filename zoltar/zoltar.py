@@ -1,9 +1,14 @@
-from gpiozero import AngularServo, Button, LED
+from gpiozero import AngularServo
 import os
 import subprocess
+import sys
 from time import sleep
-from utils import comms
+from utils import comms, hardware
 import argparse
+import threading
+import time
+import printer_service
+from motion import MotionEngine, TICK, trajectory
 
 SERVO_GPIO          = 19
 SERVO_MIN_ANGLE     = 0
@@ -14,38 +19,76 @@ BUTTON_GPIO         = 5
 LED1_GPIO           = 17
 LED2_GPIO           = 27
 
+# the whole sweep, worked out once
+SWEEP = trajectory(SERVO_MIN_ANGLE, SERVO_MAX_ANGLE)
+
+# when to send COMPLETE to start the next panel: as soon as the coin
+# is in, once the eyes finish flashing, or once the fortune is out
+# (falling back to the eyes if the printer service can't tell us)
+NEXT_POLICIES       = ('coin', 'eyes', 'printed')   # or None to send nothing
+PRINT_TIMEOUT       = 30
+
 
 class Zoltar(object):
-    def __init__(self, comm_client):
+    '''One per process: the hardware is opened here once and armed and
+    disarmed for each round rather than rebuilt'''
+
+    def __init__(self, comm_client, next_policy='eyes', next_delay=0):
         print('Finally, a Zoltar!')
+        self.next_policy = next_policy
+        self.next_delay = next_delay
         self.is_moving = False
-        self.left_eye = LED(LED1_GPIO)
-        self.right_eye = LED(LED2_GPIO)
-        self.button = Button(BUTTON_GPIO)
-        self.button.when_pressed = self.stop_moving
+        self.coin_latencies = []
+        self.left_eye = hardware.led(LED1_GPIO)
+        self.right_eye = hardware.led(LED2_GPIO)
+        self.button = hardware.button(BUTTON_GPIO)
+        self.servo = hardware.device(AngularServo, SERVO_GPIO,
+                     min_angle=SERVO_MIN_ANGLE,
+                     max_angle=SERVO_MAX_ANGLE,
+                     initial_angle=SERVO_INITIAL_ANGLE)
+        self.motion = MotionEngine(self.servo, SWEEP)
         self.communications = comm_client
+        self.coin = comm_client.subscribe('COIN')
+
+    def arm(self):
+        '''Get ready for a round: arm at the top, button live, no stale coins'''
+        while self.coin.available():
+            self.coin.recv()
+        self.servo.angle = SERVO_INITIAL_ANGLE
+        self.button.when_pressed = self.stop_moving
+        self.is_moving = True
+
+    def disarm(self):
+        '''End of a round: button ignored, eyes off, servo let go'''
+        self.is_moving = False
+        hardware.reset()
+
+    def play_round(self):
+        self.arm()
+        try:
+            self.begin_moving()
+        finally:
+            self.disarm()
 
     def begin_moving(self):
         self.left_eye.on()
         self.right_eye.on()
-        self.servo = AngularServo(SERVO_GPIO,
-                     min_angle=SERVO_MIN_ANGLE,
-                     max_angle=SERVO_MAX_ANGLE,
-                     initial_angle=SERVO_INITIAL_ANGLE)
-        while self.is_moving:
-            if self.communications.available():
-                (origin, message) = self.communications.recv()
-                if message == 'COIN':
-                    break
-            for x in reversed(range(0, 179)):
-                self.servo.angle = x
-                sleep(0.01)
-            for x in range(0, 179):
-                self.servo.angle = x
-                if self.servo.angle == 0 :
-                    sleep(0.5)
-                else:
-                    sleep(0.01)
+        self.motion.start()
+        # the arm moves on its own thread; the button stops it from
+        # gpiozero's, and a COIN from the bus stops it from here
+        while self.is_moving and self.motion.moving():
+            (origin, message) = self.coin.recv(timeout=TICK)
+            if message:
+                self.motion.stop('coin from {0}'.format(origin))
+        self.motion.stop('button')
+        self.motion.wait()
+        if self.motion.latency is None:
+            # the thread died (e.g. a servo write failed) before any stop
+            print('Motion thread ended without a coin, skipping the finale')
+            return
+        self.coin_latencies.append(self.motion.latency)
+        print('Coin detected ({0}), arm stopped in {1:.1f}ms'.format(
+            self.motion.reason, self.motion.latency * 1000))
         self.finale()
 
     def eyes_off(self):
@@ -57,13 +100,63 @@ class Zoltar(object):
         self.right_eye.on()
 
     def finale(self):
+        # printing, the eyes and the next panel's trigger all run at
+        # once from the moment the coin was detected
+        self.coin_time = self.motion.requested
+        self.printed_known = True
+        self.eyes_done = threading.Event()
+        self.next_lock = threading.Lock()
+        self.next_started = False
+        self.next_sent = threading.Event()
+        self.phase('coin')
+
+        printing = threading.Thread(target=self.print_fortune, name='print')
+        printing.start()
+        if self.next_policy == 'coin':
+            self.send_next()
+
         self.flashing_eyes()
-        self.print_fortune()
-        self.cleanup_gpio()
+        self.eyes_done.set()
+        self.phase('eyes done')
+        if self.next_policy == 'eyes' or (self.next_policy == 'printed' and not self.printed_known):
+            self.send_next()
+
+        if self.next_policy is None:
+            self.next_sent.set()
+        self.next_sent.wait()
+
+    def phase(self, name):
+        print('Finale {0:+.3f}s: {1}'.format(time.monotonic() - self.coin_time, name))
+
+    def send_next(self):
+        with self.next_lock:
+            if self.next_started:
+                return
+            self.next_started = True
+        if self.next_delay:
+            sleep(self.next_delay)
+        self.communications.send('COMPLETE')
+        self.phase('COMPLETE sent ({0})'.format(self.next_policy))
+        self.next_sent.set()
 
     def print_fortune(self):
-        zoltar_dir = os.getenv('ZOLTAR_DIR')
-        subprocess.Popen(['python','zoltar_print_fortune.py'], cwd=zoltar_dir)
+        result = printer_service.request_print(self.coin_time, wait=PRINT_TIMEOUT)
+        if result == printer_service.PRINTED:
+            self.phase('fortune printed')
+        elif result == printer_service.NO_SERVICE:
+            # no printer service running, print from a one-off process
+            self.printed_known = False
+            zoltar_dir = os.getenv('ZOLTAR_DIR')
+            # the script needs Python 3, which the default python may not be
+            subprocess.Popen([sys.executable, 'zoltar_print_fortune.py'], cwd=zoltar_dir)
+            self.phase('fortune handed to zoltar_print_fortune.py')
+        else:
+            # the service still has the printer open, so a second
+            # writer would only interleave with it
+            self.printed_known = False
+            self.phase('fortune not printed: {0}'.format(result))
+        if self.next_policy == 'printed' and (self.printed_known or self.eyes_done.is_set()):
+            self.send_next()
 
     def flashing_eyes(self):
         self.eyes_off()
@@ -77,39 +170,41 @@ class Zoltar(object):
         self.eyes_off()
 
     def stop_moving(self):
+        pressed = time.monotonic()
+        self.motion.stop('button', pressed)
         print('Button detected')
         self.is_moving = False
 
-    def cleanup_gpio(self):
-        self.left_eye.close()
-        self.right_eye.close()
-        self.servo.close()
-        self.button.close()
+    def close(self):
+        self.disarm()
+        self.coin.cancel()
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('-l', '--local', action='store_true', help='local mode - play game over and over')
+    parser.add_argument('-n', '--next', choices=NEXT_POLICIES, default='eyes', help='when to start the next panel')
+    parser.add_argument('-d', '--next-delay', type=float, default=0, help='extra seconds to wait before starting it')
     args = parser.parse_args()
 
     wof = comms.Comms()
-    wof.begin('zoltar')
+    wof.begin('zoltar', reliable=True)
+    reset = wof.subscribe('RESET')
 
+    if args.local:
+        # nothing else on the wall is playing, so don't start it
+        a_zoltar = Zoltar(wof, next_policy=None)
+    else:
+        a_zoltar = Zoltar(wof, args.next, args.next_delay)
 
     while True:
         if args.local:
-            a_zoltar = Zoltar()
-            a_zoltar.is_moving = True
-            a_zoltar.begin_moving()
-        if wof.available():
-            (origin, message) = wof.recv()
-            if message == 'RESET':
-                a_zoltar = Zoltar(wof)
-                a_zoltar.is_moving = True
-                a_zoltar.begin_moving()
-                sleep(3)
-                wof.send('COMPLETE')
-            else:
+            a_zoltar.play_round()
+            sleep(1)
+        else:
+            reset.recv(timeout=None)
+            a_zoltar.play_round()
+            while wof.available():
+                (origin, message) = wof.recv()
                 print('Unknown message: ', message)
                 print('Unknown origin: ', origin)
-        sleep(1)